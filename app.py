@@ -1,22 +1,26 @@
 import sys
 import os
+import json
 import logging
-import tempfile
+import threading
 import time
 import traceback
-from flask import Flask, request, jsonify, render_template
-from langchain_community.document_loaders import TextLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_huggingface import HuggingFacePipeline
 from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
+from langchain.chains.conversational_retrieval.base import _get_chat_history
+from langchain_core.prompts import format_document
 from langchain.schema import Document
-from thefuzz import fuzz
-from scraper import fetch_page, build_website_map, scrape_contact_info_fallback, scrape_targeted_content
-from database import init_db, clear_database, get_content, store_content, get_contact_info, store_contact_info
-from nlp import extract_keywords_and_intent
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+from scraper import fetch_page, build_website_map, default_website_map, scrape_contact_info_fallback, scrape_targeted_content
+from database import init_db, clear_database, get_content, get_content_version, iter_content, store_content, get_contact_info, store_contact_info
+from cache import LRUCache
+from concurrency import CircuitBreaker, SingleFlight
+from inference import BatchedEmbeddings, BatchedPipeline, OnnxEmbeddings
+from vector_index import open_vector_store, update_vector_store
+from sessions import SessionMemoryStore
+from nlp import extract_keywords_and_intent, get_intent_cache_stats, lookup_route, normalize_message, routing_table, set_intent_embeddings
 
 # Configure logging to file and console
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[
@@ -31,10 +35,53 @@ app = Flask(__name__)
 website_map = {}
 user_sessions = {}
 langchain_retriever = None
+langchain_vector_store = None
+# Content version the vector store was last synced at; a newer version triggers a background re-embed of changed sections
+indexed_content_version = None
 conversational_chain = None
-memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True, output_key="answer")
+# Conversation history per session_id, bounded so prompts stay short and memory flat under many chats
+session_memory = SessionMemoryStore(
+    max_turns=int(os.environ.get('SESSION_MAX_TURNS', 6)),
+    max_session_chars=int(os.environ.get('SESSION_MAX_CHARS', 4000)),
+    ttl=int(os.environ.get('SESSION_TTL_SECONDS', 1800)),
+    max_sessions=int(os.environ.get('SESSION_MAX_SESSIONS', 1000)),
+    max_total_chars=int(os.environ.get('SESSION_MAX_TOTAL_CHARS', 2000000))
+)
 langchain_failed = False
 MAIN_URL = "https://stolmeierlaw.com/"
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# Embedding backend: torch (sentence-transformers) or onnx (exported once to onnx_models/, optionally int8-quantized)
+EMBEDDING_BACKEND = os.environ.get('EMBEDDING_BACKEND', 'torch')
+EMBEDDING_QUANTIZE = os.environ.get('EMBEDDING_QUANTIZE', '0') == '1'
+EMBEDDING_THREADS = int(os.environ.get('EMBEDDING_THREADS', 0)) or None
+VECTOR_STORE_DIRECTORY = os.path.join(os.getcwd(), "chroma_db")
+# Vector store backend: chroma, faiss-flat or faiss-hnsw (FAISS indexes are memory-mapped so worker processes share them)
+VECTOR_STORE = os.environ.get('VECTOR_STORE', 'chroma')
+
+# Background warm-up: stages run in order at boot and report progress through /healthz and /readyz
+WARMUP_STAGES = ('map', 'content', 'index', 'llm')
+warmup_stages = {stage: {'state': 'pending'} for stage in WARMUP_STAGES}
+warmup_thread = None
+warmup_lock = threading.Lock()
+# One website map build and one LangChain initialization at a time, however many requests ask for it
+init_flight = SingleFlight()
+# Failed LangChain initialization is retried in the background with exponential backoff while requests get a fast fallback
+langchain_breaker = CircuitBreaker(
+    base_delay=float(os.environ.get('LANGCHAIN_RETRY_BASE_SECONDS', 5)),
+    max_delay=float(os.environ.get('LANGCHAIN_RETRY_MAX_SECONDS', 300))
+)
+# Concurrent query embeddings and flan-t5 generations arriving within BATCH_WAIT_MS run as one batched call
+BATCH_WAIT_SECONDS = float(os.environ.get('BATCH_WAIT_MS', 20)) / 1000
+EMBED_BATCH_SIZE = int(os.environ.get('EMBED_BATCH_SIZE', 32))
+GENERATION_BATCH_SIZE = int(os.environ.get('GENERATION_BATCH_SIZE', 8))
+inference_batchers = {}
+
+# Sections whose description (and subsection rows) feed the vector store
+INDEXED_SECTIONS = (
+    'Car Accidents', 'Medical Malpractice', 'Slip Trip Fall', 'Truck Accidents',
+    '18-Wheeler Accidents', 'Motorcycle Accidents', 'Dog Bites & Attacks',
+    'Product Liability', 'Wrongful Death', 'Recent Results', 'About', 'Contact Us'
+)
 
 # Define fallback_content globally
 fallback_content = {
@@ -85,6 +132,27 @@ subsection_fallbacks = {
     'Immediate Help - Schedule Consultation': "Schedule a free consultation by calling Stolmeier Law at 210-227-3612."
 }
 
+# Exact-match message lists, normalized once so typed and typographic variants hit them alike
+generic_messages = {normalize_message(m) for m in ["help me", "hii", "hi", "hello", "hey"]}
+accident_messages = {normalize_message(m) for m in ["accidents", "accident", "accidents services"]}
+contact_messages = {normalize_message(m) for m in [
+    "contact us", "contact", "phone", "email", "address", "contact in email, address, phone no",
+    "are you available in [city/state]", "what areas do you serve", "can i speak with someone now",
+    "can i talk to a lawyer right now", "what’s the fastest way to get help", "how do i schedule a consultation",
+    "where are you located", "what is your email", "how to reach you"
+]}
+feedback_messages = {"yes", "no"}
+
+# Rendered content per resolved route (service or subsection), invalidated by the page's content version
+response_cache = LRUCache(
+    maxsize=int(os.environ.get('RESPONSE_CACHE_SIZE', 512)),
+    ttl=float(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', 600))
+)
+render_flight = SingleFlight()
+
+# Fully rendered responses for Quick Options and canonical questions, rebuilt when stored content or the site map changes
+quick_response_table = {'version': None, 'responses': {}}
+
 def adjust_to_100_words(text, is_fallback=False, keyword=None):
     """Adjust text to 50-100 words, using concise fallback if needed."""
     words = text.split()
@@ -107,152 +175,315 @@ def format_list_response(content, content_type):
         return f"What to do after a car accident:\n{content}\nContact Stolmeier Law at 210-227-3612 for assistance."
     return content
 
+def run_stage(stage, func, *args):
+    """Run one initialization stage, recording its state and duration; returns None if it failed."""
+    warmup_stages[stage] = {'state': 'running'}
+    started = time.perf_counter()
+    try:
+        result = func(*args)
+    except Exception as e:
+        logging.error(f"Error in {stage} stage: {str(e)}\n{traceback.format_exc()}")
+        result = None
+    warmup_stages[stage] = {'state': 'failed' if result is None else 'done', 'seconds': round(time.perf_counter() - started, 3)}
+    logging.debug(f"Stage {stage} {warmup_stages[stage]['state']} in {warmup_stages[stage]['seconds']}s")
+    return result
+
+def seed_section_content():
+    """Store content for every indexed section and Car Accidents subsection that has none, from scrapes or fallbacks."""
+    logging.debug("Seeding content for sections...")
+    for section in INDEXED_SECTIONS:
+        logging.debug(f"Processing section: {section}")
+        content = get_content(section, 'description')
+        if not content or content.startswith("Sorry,") or len(content.split()) < 30:
+            logging.debug(f"No valid cached content for {section}, checking fallback...")
+            content = fallback_content.get(section, f"{section} content placeholder.")
+            section_url = website_map.get(section, {}).get('url', MAIN_URL)
+            scraped_content = scrape_targeted_content([section], 'description', 'init_session', section_url, website_map)
+            if scraped_content and not scraped_content.startswith("Sorry,") and "lorem ipsum" not in scraped_content.lower():
+                content = adjust_to_100_words(scraped_content)
+            else:
+                content = adjust_to_100_words(fallback_content.get(section, f"{section} content placeholder."), is_fallback=True, keyword=section)
+            store_content(section, section_url, 'description', content)
+
+        if section == "Car Accidents":
+            for subsection, sub_content in subsection_fallbacks.items():
+                if not get_content(subsection, subsection.split(' - ')[1].lower()):
+                    store_content(subsection, MAIN_URL, subsection.split(' - ')[1].lower(), sub_content)
+            for sub in ['Causes', 'What to Do', 'Injuries', 'Uninsured Driver', 'Claim Deadline', 'Partial Fault']:
+                logging.debug(f"Processing {sub} for Car Accidents")
+                subsection = sub.lower()
+                content_key = f"Car Accidents - {sub}"
+                sub_content = get_content(content_key, subsection)
+                if not sub_content or sub_content.startswith("Sorry,") or len(sub_content.strip()) < 10:
+                    logging.debug(f"No valid cached {subsection} for Car Accidents, scraping...")
+                    section_url = website_map.get(section, {}).get('url', MAIN_URL)
+                    sub_content = scrape_targeted_content([subsection, section], subsection, 'init_session', section_url, website_map)
+                    if sub_content and not sub_content.startswith("Sorry,"):
+                        store_content(content_key, section_url, subsection, sub_content)
+                    else:
+                        sub_content = subsection_fallbacks.get(content_key, f"Our team will reach you soon regarding {subsection}. Contact 210-227-3612.")
+                        store_content(content_key, section_url, subsection, sub_content)
+
+        if section == "Contact Us":
+            contact_content = get_content(section, 'contact')
+            if not contact_content or contact_content.startswith("Sorry,") or len(contact_content.split()) < 10:
+                contact_content = scrape_contact_info_fallback()
+                store_content(section, MAIN_URL, 'contact', contact_content)
+                store_contact_info(contact_content)
+    return True
+
+def iter_section_documents():
+    """Yield one Document per stored section description and subsection row, with its page, URL, section and subsection as metadata."""
+    for page_title, url, content_type, content in iter_content():
+        section, _, subsection = page_title.partition(' - ')
+        # Section pages contribute their description, subsection pages ("Section - Subsection") their own content type
+        if section not in INDEXED_SECTIONS or (content_type == 'description') == bool(subsection) or not content:
+            continue
+        yield Document(page_content=content, metadata={
+            'page_title': page_title,
+            'content_type': content_type,
+            'url': url or MAIN_URL,
+            'section': section,
+            'subsection': subsection
+        })
+
+def load_embeddings():
+    """Return the configured embedding backend and the model id recorded in the vector store manifest."""
+    if EMBEDDING_BACKEND == 'onnx':
+        embeddings = OnnxEmbeddings(EMBEDDING_MODEL, os.path.join(os.getcwd(), "onnx_models"), quantize=EMBEDDING_QUANTIZE, threads=EMBEDDING_THREADS)
+        # int8 vectors differ slightly from the torch ones, so a quantized model gets its own index
+        return embeddings, f"{EMBEDDING_MODEL}+onnx-int8" if EMBEDDING_QUANTIZE else EMBEDDING_MODEL
+    return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL), EMBEDDING_MODEL
+
+def build_vector_store(load_documents):
+    """Open the persisted vector store, re-embedding only what changed; load_documents returns a fresh document iterator per attempt."""
+    max_retries = 3
+    for attempt in range(max_retries):
+        try:
+            logging.debug("Initializing embeddings...")
+            base_embeddings, model_id = load_embeddings()
+            embeddings = BatchedEmbeddings(base_embeddings, max_batch=EMBED_BATCH_SIZE, max_wait=BATCH_WAIT_SECONDS)
+            logging.debug(f"Initializing {VECTOR_STORE} vector store...")
+            vector_store = open_vector_store(load_documents(), embeddings, model_id, VECTOR_STORE_DIRECTORY, backend=VECTOR_STORE)
+            logging.debug(f"{VECTOR_STORE} vector store initialized successfully")
+            inference_batchers['embeddings'] = embeddings.batcher
+            break
+        except Exception as e:
+            logging.error(f"Attempt {attempt + 1}/{max_retries} - Error initializing {VECTOR_STORE} vector store: {str(e)}\n{traceback.format_exc()}")
+            if attempt == max_retries - 1:
+                return None
+            time.sleep(2)
+
+    try:
+        set_intent_embeddings(embeddings)
+    except Exception as e:
+        logging.error(f"Error embedding canonical questions for intent classification: {str(e)}")
+    return vector_store
+
+def build_conversational_chain(vector_store):
+    """Load the LLM and wire it to the retriever; callers pass each session's chat history."""
+    global langchain_retriever
+    max_retries = 3
+    for attempt in range(max_retries):
+        try:
+            logging.debug("Initializing LLM...")
+            llm = HuggingFacePipeline.from_model_id(
+                model_id="google/flan-t5-base",
+                task="text2text-generation",
+                pipeline_kwargs={"max_length": 1000}
+            )
+            llm.pipeline = BatchedPipeline(llm.pipeline, max_batch=GENERATION_BATCH_SIZE, max_wait=BATCH_WAIT_SECONDS)
+            inference_batchers['generation'] = llm.pipeline.batcher
+            logging.debug("LLM initialized successfully")
+            break
+        except Exception as e:
+            logging.error(f"Attempt {attempt + 1}/{max_retries} - Error initializing LLM: {str(e)}")
+            if attempt == max_retries - 1:
+                return None
+            time.sleep(2)
+
+    logging.debug("Setting up retriever and conversational chain...")
+    langchain_retriever = vector_store.as_retriever(search_kwargs={"k": 2})
+    return ConversationalRetrievalChain.from_llm(
+        llm=llm,
+        retriever=langchain_retriever,
+        return_source_documents=True,
+        output_key="answer"
+    )
+
 def initialize_langchain():
     """Initialize LangChain with pre-defined content to avoid scraping delays."""
-    global langchain_retriever, conversational_chain, langchain_failed
+    global conversational_chain, langchain_failed, langchain_vector_store, indexed_content_version
     logging.debug("Starting LangChain initialization...")
     try:
-        target_sections = [
-            'Car Accidents', 'Medical Malpractice', 'Slip Trip Fall', 'Truck Accidents',
-            '18-Wheeler Accidents', 'Motorcycle Accidents', 'Dog Bites & Attacks',
-            'Product Liability', 'Wrongful Death', 'Recent Results', 'About', 'Contact Us'
-        ]
-
-        logging.debug("Loading documents for sections...")
-        documents = []
-        for section in target_sections:
-            logging.debug(f"Processing section: {section}")
-            content = get_content(section, 'description')
-            if not content or content.startswith("Sorry,") or len(content.split()) < 30:
-                logging.debug(f"No valid cached content for {section}, checking fallback...")
-                content = fallback_content.get(section, f"{section} content placeholder.")
-                section_url = website_map.get(section, {}).get('url', MAIN_URL)
-                scraped_content = scrape_targeted_content([section], 'description', 'init_session', section_url, website_map)
-                if scraped_content and not scraped_content.startswith("Sorry,") and "lorem ipsum" not in scraped_content.lower():
-                    content = adjust_to_100_words(scraped_content)
-                else:
-                    content = adjust_to_100_words(fallback_content.get(section, f"{section} content placeholder."), is_fallback=True, keyword=section)
-                store_content(section, section_url, 'description', content)
-
-            if section == "Car Accidents":
-                for subsection, sub_content in subsection_fallbacks.items():
-                    if not get_content(subsection, subsection.split(' - ')[1].lower()):
-                        store_content(subsection, MAIN_URL, subsection.split(' - ')[1].lower(), sub_content)
-                for sub in ['Causes', 'What to Do', 'Injuries', 'Uninsured Driver', 'Claim Deadline', 'Partial Fault']:
-                    logging.debug(f"Processing {sub} for Car Accidents")
-                    subsection = sub.lower()
-                    content_key = f"Car Accidents - {sub}"
-                    sub_content = get_content(content_key, subsection)
-                    if not sub_content or sub_content.startswith("Sorry,") or len(sub_content.strip()) < 10:
-                        logging.debug(f"No valid cached {subsection} for Car Accidents, scraping...")
-                        section_url = website_map.get(section, {}).get('url', MAIN_URL)
-                        sub_content = scrape_targeted_content([subsection, section], subsection, 'init_session', section_url, website_map)
-                        if sub_content and not sub_content.startswith("Sorry,"):
-                            store_content(content_key, section_url, subsection, sub_content)
-                        else:
-                            sub_content = subsection_fallbacks.get(content_key, f"Our team will reach you soon regarding {subsection}. Contact 210-227-3612.")
-                            store_content(content_key, section_url, subsection, sub_content)
-
-            if section == "Contact Us":
-                contact_content = get_content(section, 'contact')
-                if not contact_content or contact_content.startswith("Sorry,") or len(contact_content.split()) < 10:
-                    contact_content = scrape_contact_info_fallback()
-                    store_content(section, MAIN_URL, 'contact', contact_content)
-                    store_contact_info(contact_content)
-
-            logging.debug(f"Creating temporary file for {section}")
-            try:
-                with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt', encoding='utf8') as temp_file:
-                    temp_file.write(content)
-                    temp_file_path = temp_file.name
-            except Exception as e:
-                logging.error(f"Error creating temp file for {section}: {str(e)}")
-                continue
-
-            try:
-                logging.debug(f"Loading document from {temp_file_path}")
-                loader = TextLoader(temp_file_path, encoding='utf-8')
-                docs = loader.load()
-                for doc in docs:
-                    doc.metadata = {"page_title": section, "url": MAIN_URL}
-                    documents.append(doc)
-            except Exception as e:
-                logging.error(f"Error loading document for {section}: {str(e)}")
-            finally:
-                try:
-                    os.unlink(temp_file_path)
-                    logging.debug(f"Deleted temp file: {temp_file_path}")
-                except Exception as e:
-                    logging.warning(f"Error deleting temp file {temp_file_path}: {str(e)}")
-
-        if not documents:
-            logging.error("No valid documents loaded. Aborting LangChain initialization.")
+        content_version = get_content_version()
+        seeded = run_stage('content', seed_section_content)
+        vector_store = run_stage('index', build_vector_store, iter_section_documents) if seeded else None
+        chain = run_stage('llm', build_conversational_chain, vector_store) if vector_store else None
+        if chain is None:
+            logging.error("LangChain initialization failed.")
             langchain_failed = True
             return
+        langchain_vector_store = vector_store
+        indexed_content_version = content_version
+        conversational_chain = chain
+        langchain_failed = False
+        logging.debug("LangChain initialization complete.")
+    except Exception as e:
+        logging.error(f"Unexpected error in initialize_langchain: {str(e)}\n{traceback.format_exc()}")
+        langchain_failed = True
+        return
 
-        logging.debug(f"Loaded {len(documents)} documents")
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50, length_function=len)
-        split_docs = text_splitter.split_documents(documents)
-        logging.debug(f"Split into {len(split_docs)} document chunks")
+def refresh_vector_store():
+    """Re-embed the sections whose stored content changed since the vector store was last synced."""
+    global indexed_content_version, langchain_vector_store
+    content_version = get_content_version()
+    try:
+        vector_store, changed = update_vector_store(langchain_vector_store, iter_section_documents(), VECTOR_STORE_DIRECTORY)
+        if vector_store is not langchain_vector_store:
+            langchain_retriever.vectorstore = vector_store  # FAISS updates arrive as a new build; the chain picks it up through its retriever
+            langchain_vector_store = vector_store
+        if changed:
+            logging.debug(f"Re-embedded changed sections: {changed}")
+        indexed_content_version = content_version
+    except Exception as e:
+        logging.error(f"Error refreshing vector store: {str(e)}\n{traceback.format_exc()}")
 
-        max_retries = 3
-        for attempt in range(max_retries):
+def start_index_refresh():
+    """Sync the vector store in the background if stored content changed since it was last synced."""
+    if langchain_vector_store is None or get_content_version() == indexed_content_version or init_flight.in_flight('reindex'):
+        return
+    threading.Thread(target=init_flight.try_do, args=('reindex', refresh_vector_store), name='reindex', daemon=True).start()
+
+def ensure_langchain():
+    """Initialize LangChain unless a working chain is already available, reporting the outcome to the breaker."""
+    if langchain_failed or conversational_chain is None:
+        initialize_langchain()
+    if langchain_failed or conversational_chain is None:
+        langchain_breaker.record_failure()
+    else:
+        langchain_breaker.record_success()
+
+def warm_up():
+    """Build the website map, section content, vector index and LLM chain in the background."""
+    global website_map
+    started = time.perf_counter()
+    checked_map = init_flight.do('map', run_stage, 'map', build_website_map)
+    if checked_map:
+        website_map = checked_map
+    while True:
+        if langchain_breaker.allow():
             try:
-                logging.debug("Initializing embeddings...")
-                embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-                logging.debug("Initializing Chroma vector store...")
-                persist_directory = os.path.join(os.getcwd(), "chroma_db")
-                vector_store = Chroma.from_documents(
-                    documents=split_docs,
-                    embedding=embeddings,
-                    persist_directory=persist_directory
-                )
-                logging.debug("Chroma vector store initialized successfully")
-                break
+                init_flight.do('langchain', ensure_langchain)
             except Exception as e:
-                logging.error(f"Attempt {attempt + 1}/{max_retries} - Error initializing Chroma: {str(e)}\n{traceback.format_exc()}")
-                if attempt == max_retries - 1:
-                    langchain_failed = True
-                    return
-                time.sleep(2)
-
-        for attempt in range(max_retries):
-            try:
-                logging.debug("Initializing LLM...")
-                llm = HuggingFacePipeline.from_model_id(
-                    model_id="google/flan-t5-base",
-                    task="text2text-generation",
-                    pipeline_kwargs={"max_length": 1000}
-                )
-                logging.debug("LLM initialized successfully")
+                logging.error(f"Unexpected error warming up LangChain: {str(e)}\n{traceback.format_exc()}")
+                langchain_breaker.record_failure()
+            if conversational_chain is not None and not langchain_failed:
                 break
-            except Exception as e:
-                logging.error(f"Attempt {attempt + 1}/{max_retries} - Error initializing LLM: {str(e)}")
-                if attempt == max_retries - 1:
-                    langchain_failed = True
-                    return
-                time.sleep(2)
+            logging.warning(f"LangChain initialization failed; circuit open, retrying in {langchain_breaker.retry_in():.0f}s")
+        time.sleep(max(langchain_breaker.retry_in(), 0.1))
+    logging.info(f"Warm-up finished in {time.perf_counter() - started:.1f}s, ready: {is_ready()}")
+
+def start_warmup():
+    """Start the background warm-up once per process."""
+    global warmup_thread
+    with warmup_lock:
+        if warmup_thread is None:
+            warmup_thread = threading.Thread(target=warm_up, name='warmup', daemon=True)
+            warmup_thread.start()
+
+def warmup_running():
+    """Return True while the background warm-up is still working through its stages or retrying LangChain."""
+    return warmup_thread is not None and warmup_thread.is_alive()
+
+def is_ready():
+    """Return True once the website map is built and the conversational chain is available."""
+    return bool(website_map) and conversational_chain is not None and not langchain_failed
+
+def render_service_content(title, session_id):
+    """Return a service's description, scraping and storing it when the stored copy is unusable."""
+    section_url = website_map.get(title, {}).get('url', MAIN_URL)
+    content = get_content(title, 'description')
+    if not content or content.startswith("Sorry,") or len(content.split()) < 30:
+        logging.debug(f"Scraping description for {title}")
+        content = scrape_targeted_content([title], 'description', session_id, section_url, website_map)
+        if content and not content.startswith("Sorry,") and "lorem ipsum" not in content.lower():
+            content = adjust_to_100_words(content)
+            store_content(title, section_url, 'description', content)
+        else:
+            logging.warning(f"Scraping failed for {title}. Using fallback.")
+            content = adjust_to_100_words(fallback_content.get(title, f"Our team will reach you soon regarding {title}. Contact 210-227-3612."), is_fallback=True, keyword=title)
+            store_content(title, section_url, 'description', content)
+    else:
+        content = adjust_to_100_words(content)
+    return content
 
-        try:
-            logging.debug("Setting up retriever and conversational chain...")
-            langchain_retriever = vector_store.as_retriever(search_kwargs={"k": 2})
-            conversational_chain = ConversationalRetrievalChain.from_llm(
-                llm=llm,
-                retriever=langchain_retriever,
-                memory=memory,
-                return_source_documents=True,
-                output_key="answer"
-            )
-            logging.debug("LangChain initialization complete.")
-            langchain_failed = False
-        except Exception as e:
-            logging.error(f"Error initializing conversational chain: {str(e)}")
-            langchain_failed = True
-            return
-    except Exception as e:
-        logging.error(f"Unexpected error in initialize_langchain: {str(e)}\n{traceback.format_exc()}")
-        langchain_failed = True
-        return
+def render_subsection_content(section, subsection, content_key, session_id):
+    """Return a subsection's formatted answer, scraping and storing it when the stored copy is unusable."""
+    section_url = website_map.get(section, {}).get('url', MAIN_URL)
+    content = get_content(content_key, subsection)
+    if not content or content.startswith("Sorry,") or len(content.strip()) < 5:
+        logging.debug(f"Scraping {subsection} for {section}")
+        content = scrape_targeted_content([subsection, section], subsection, session_id, section_url, website_map)
+        if content and not content.startswith("Sorry,") and "lorem ipsum" not in content.lower():
+            store_content(content_key, section_url, subsection, content)
+        else:
+            content = subsection_fallbacks.get(content_key, f"Our team will reach you soon regarding {subsection}. Contact 210-227-3612.")
+            store_content(content_key, section_url, subsection, content)
+    return format_list_response(content, subsection)
+
+def cached_route_content(route, page_title, render, *args):
+    """Return the rendered content for a resolved route, shared by every phrasing that resolves to it.
+
+    Entries are keyed by the page's content version, so a store_content that changes the page
+    retires them; concurrent misses for one route share a single render (and scrape).
+    """
+    content = response_cache.get((route, get_content_version(page_title)))
+    if content is None:
+        content = render_flight.do(route, render, *args)
+        response_cache.put((route, get_content_version(page_title)), content)
+    return content
+
+def build_quick_responses(version):
+    """Render the response for every Quick Option and canonical question whose answer comes straight from stored content."""
+    global quick_response_table
+    helpful_prompt = 'Was this helpful? (Reply "yes" or "no")'
+    candidates = set(contact_messages) | {normalize_message(title) for title in website_map} | set(routing_table)
+    responses = {}
+    for message in candidates:
+        keywords, intent, corrected_message, was_corrected = extract_keywords_and_intent(message, 'quick_responses', website_map, user_sessions)
+        correction_note = f"<p class='correction-note'>Did you mean '{corrected_message}'?</p>" if was_corrected and corrected_message != message else ""
+        if intent == "accidents" or message in accident_messages:
+            continue
+        if intent == "contact" or message in contact_messages:
+            content = fallback_content['Contact Us']
+        elif intent == "feedback" or message in feedback_messages:
+            continue
+        elif intent == "service" and keywords and keywords[0] in website_map:
+            content = get_content(keywords[0], 'description')
+            if not content or content.startswith("Sorry,") or len(content.split()) < 30:
+                continue
+            content = adjust_to_100_words(content)
+        elif intent == "subsection" and keywords and lookup_route(corrected_message):
+            _, section, subsection, content_key = lookup_route(corrected_message)
+            content = get_content(content_key, subsection)
+            if not content or content.startswith("Sorry,") or len(content.strip()) < 5:
+                continue
+            content = format_list_response(content, subsection)
+        else:
+            continue
+        responses[message] = {'response': {'message': correction_note + content if correction_note else content}, 'helpful_prompt': helpful_prompt}
+    quick_response_table = {'version': version, 'responses': responses}
+    logging.debug(f"Built {len(responses)} quick responses for content version {version[0]}")
+    return quick_response_table
+
+def get_quick_response(normalized_message):
+    """Return the pre-rendered response for a Quick Option or canonical question, or None."""
+    version = (get_content_version(), tuple(website_map))
+    table = quick_response_table
+    if table['version'] != version:
+        table = init_flight.do(('quick_responses', version), build_quick_responses, version)
+    return table['responses'].get(normalized_message)
 
 @app.route('/')
 def index():
@@ -264,6 +495,197 @@ def index():
         logging.error(f"Error rendering index.html: {str(e)}")
         return jsonify({'error': 'Template not found'}), 404
 
+@app.route('/healthz')
+def healthz():
+    """Liveness probe reporting warm-up progress."""
+    start_warmup()
+    return jsonify({
+        'status': 'ok',
+        'ready': is_ready(),
+        'warming_up': warmup_running(),
+        'stages': warmup_stages,
+        'langchain_circuit': langchain_breaker.snapshot(),
+        'intent_cache': get_intent_cache_stats(),
+        'response_cache': response_cache.stats(),
+        'sessions': session_memory.stats(),
+        'batching': {name: batcher.stats() for name, batcher in inference_batchers.items()}
+    })
+
+@app.route('/readyz')
+def readyz():
+    """Readiness probe: 503 until the website map, vector index and LLM chain are loaded."""
+    start_warmup()
+    ready = is_ready()
+    return jsonify({
+        'ready': ready,
+        'warming_up': warmup_running(),
+        'stages': warmup_stages,
+        'langchain_circuit': langchain_breaker.snapshot()
+    }), 200 if ready else 503
+
+def route_query(user_message, session_id):
+    """Answer a query from the routing stages; returns (payload, correction note), with payload None when the LLM should answer."""
+    global website_map, user_sessions, langchain_failed
+    start_warmup()
+    start_index_refresh()
+    if not website_map:
+        logging.debug("Website map still warming up; using the unchecked default map")
+        website_map = default_website_map(MAIN_URL)
+
+    normalized_message = normalize_message(user_message)
+    quick_response = get_quick_response(normalized_message)
+    if quick_response:
+        logging.debug(f"Quick response hit for: {normalized_message}")
+        return quick_response, ""
+
+    if normalized_message == "no":
+        logging.debug(f"User responded 'no' for session {session_id}")
+        session_memory.clear(session_id)
+        content = "Our team will reach you soon. Contact Stolmeier Law at 210-227-3612 or chris@stolmeierlaw.com."
+        return {'response': {'message': content}, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'}, ""
+
+    if normalized_message in generic_messages:
+        content = adjust_to_100_words("I can help with services like Car Accidents, Contact Us, or others. Please ask a specific question or select a service below.")
+        session_memory.clear(session_id)
+        return {'response': {'message': content}, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'}, ""
+
+    service_titles = {title.lower(): title for title in website_map.keys()}
+    keywords, intent, corrected_message, was_corrected = extract_keywords_and_intent(user_message, session_id, website_map, user_sessions)
+    correction_note = f"<p class='correction-note'>Did you mean '{corrected_message}'?</p>" if was_corrected and corrected_message != normalized_message else ""
+
+    logging.debug(f"Processing query: {user_message}, Intent: {intent}, Keywords: {keywords}")
+
+    if intent == "accidents" or normalized_message in accident_messages:
+        logging.debug("Handling accidents intent")
+        content = adjust_to_100_words("Stolmeier Law handles various accident cases in San Antonio, including Car Accidents, Truck Accidents, and Motorcycle Accidents. Please specify a service for details.")
+        response = {'message': correction_note + content if correction_note else content}
+        return {'response': response, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'}, correction_note
+
+    if intent == "contact" or normalized_message in contact_messages:
+        logging.debug("Contact intent detected")
+        content = fallback_content['Contact Us']
+        store_content("Contact Us", MAIN_URL, "contact", content)
+        store_contact_info(content)
+        response = {'message': correction_note + content if correction_note else content}
+        return {'response': response, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'}, correction_note
+
+    if intent == "feedback" or normalized_message in feedback_messages:
+        logging.debug(f"Feedback for session {session_id}: {user_message}")
+        session_memory.clear(session_id)
+        content = adjust_to_100_words("Thank you for your feedback! Ask about services like Car Accidents, Motorcycle Accidents, or Contact Us for more information.")
+        response = {'message': correction_note + content if correction_note else content}
+        return {'response': response, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'}, correction_note
+
+    if intent == "service" and keywords and keywords[0] in service_titles.values():
+        original_title = keywords[0]
+        try:
+            content = cached_route_content(('service', original_title), original_title, render_service_content, original_title, session_id)
+            response = {'message': correction_note + content if correction_note else content}
+            return {'response': response, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'}, correction_note
+        except Exception as e:
+            logging.error(f"Error processing service {original_title}: {str(e)}")
+            content = adjust_to_100_words(fallback_content.get(original_title, f"Our team will reach you soon regarding {original_title}. Contact 210-227-3612."), is_fallback=True, keyword=original_title)
+            response = {'message': correction_note + content if correction_note else content}
+            return {'response': response, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'}, correction_note
+
+    if intent == "subsection" and keywords:
+        route = lookup_route(corrected_message)
+        if route:
+            _, section, subsection, content_key = route
+        else:
+            section = next((title for title in service_titles.values() if title.lower() in corrected_message.lower()), None)
+            if not section:
+                section = "Car Accidents" if "accident" in corrected_message.lower() else "General"
+            subsection = keywords[0].lower() if keywords else None
+            content_key = f"{section} - {subsection.capitalize()}"
+        try:
+            content = cached_route_content(('subsection', content_key, subsection), content_key, render_subsection_content, section, subsection, content_key, session_id)
+            response = {'message': correction_note + content if correction_note else content}
+            return {'response': response, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'}, correction_note
+        except Exception as e:
+            logging.error(f"Error processing subsection query {section} - {subsection}: {str(e)}")
+            content = format_list_response(subsection_fallbacks.get(content_key, f"Our team will reach you soon regarding {subsection}. Contact 210-227-3612."), subsection)
+            response = {'message': correction_note + content if correction_note else content}
+            return {'response': response, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'}, correction_note
+
+    if langchain_failed or conversational_chain is None:
+        logging.debug(f"LangChain unavailable (circuit {langchain_breaker.state}); answering general query with fallback")
+        content = adjust_to_100_words("Our team will reach you soon. Contact Stolmeier Law at 210-227-3612 or chris@stolmeierlaw.com.", is_fallback=True, keyword=user_message)
+        response = {'message': correction_note + content if correction_note else content}
+        return {'response': response, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'}, correction_note
+    return None, correction_note
+
+def format_general_answer(user_message, answer, correction_note):
+    """Build the response payload for an LLM answer."""
+    content = adjust_to_100_words(answer, is_fallback=True, keyword=user_message)
+    response = {'message': correction_note + content if correction_note else content}
+    return {'response': response, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'}
+
+def capped_answer_chunks(chunks, answer_parts):
+    """Yield an answer's chunks as they are generated, collecting them in answer_parts, until it passes the 100 words adjust_to_100_words keeps."""
+    for text in chunks:
+        answer_parts.append(text)
+        yield text
+        if len(''.join(answer_parts).split()) > 100:
+            break
+
+class StopWhenSet(StoppingCriteria):
+    """Stop generation once an event is set."""
+
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return self.event.is_set()
+
+def stream_llm(llm, prompt):
+    """Yield the LLM's output for prompt in chunks as it is generated; LLMs without a local model yield it whole."""
+    pipe = getattr(llm, 'pipeline', None)
+    if pipe is None or getattr(pipe, 'model', None) is None:
+        yield llm.invoke(prompt)
+        return
+    streamer = TextIteratorStreamer(pipe.tokenizer, skip_prompt=True, skip_special_tokens=True)
+    stopped = threading.Event()
+    errors = []
+    inputs = pipe.tokenizer(prompt, return_tensors='pt', truncation=True).to(pipe.device)
+    inputs = {name: inputs[name] for name in ('input_ids', 'attention_mask') if name in inputs}
+
+    def generate():
+        try:
+            pipe.model.generate(
+                **inputs, **(llm.pipeline_kwargs or {}), streamer=streamer,
+                stopping_criteria=StoppingCriteriaList([StopWhenSet(stopped)])
+            )
+        except Exception as e:
+            errors.append(e)
+            streamer.end()
+
+    thread = threading.Thread(target=generate, name='llm-stream', daemon=True)
+    thread.start()
+    try:
+        for text in streamer:
+            if text:
+                yield text
+    finally:
+        stopped.set()  # stop generating when the client goes away or enough words have been sent
+    if errors:
+        raise errors[0]
+
+def stream_chain_answer(chain, question, chat_history):
+    """Run the conversational chain's steps for one question, yielding the answer in chunks as it is generated."""
+    if chat_history:
+        history_text = (chain.get_chat_history or _get_chat_history)(chat_history)
+        question = chain.question_generator.invoke({'question': question, 'chat_history': history_text})['text']
+    docs = chain.retriever.invoke(question)
+    combine = chain.combine_docs_chain
+    context = combine.document_separator.join(format_document(doc, combine.document_prompt) for doc in docs)
+    prompt = combine.llm_chain.prompt.format(context=context, question=question)
+    yield from stream_llm(combine.llm_chain.llm, prompt)
+
+def sse_event(event, data):
+    """Format one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.route('/rag_query', methods=['POST'])
 def rag_query():
     """Handle user queries with strict prioritization and caching."""
@@ -276,181 +698,15 @@ def rag_query():
             logging.error("No message received")
             return jsonify({'error': 'Please provide a question or select a service.'})
 
-        global website_map, user_sessions, langchain_failed
-        if not website_map:
-            website_map = build_website_map()
-            if not website_map:
-                logging.error("Failed to build website map")
-                return jsonify({'error': 'Unable to access the website.'})
-
-        if langchain_failed or conversational_chain is None:
-            logging.debug("Retrying LangChain initialization due to failure or None conversational_chain")
-            initialize_langchain()
-            if langchain_failed:
-                logging.error("LangChain initialization failed after retry")
-                return jsonify({'error': 'Sorry, I’m having trouble processing your request.'})
-
-        if user_message.lower() == "no":
-            logging.debug(f"User responded 'no' for session {session_id}")
-            memory.clear()
-            content = "Our team will reach you soon. Contact Stolmeier Law at 210-227-3612 or chris@stolmeierlaw.com."
-            return jsonify({'response': {'message': content}, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'})
-
-        generic_messages = ["help me", "hii", "hi", "hello", "hey"]
-        if user_message.lower() in generic_messages:
-            content = adjust_to_100_words("I can help with services like Car Accidents, Contact Us, or others. Please ask a specific question or select a service below.")
-            memory.clear()
-            return jsonify({'response': {'message': content}, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'})
-
-        service_titles = {title.lower(): title for title in website_map.keys()}
-        keywords, intent, corrected_message, was_corrected = extract_keywords_and_intent(user_message, session_id, website_map, user_sessions)
-        correction_note = f"<p class='correction-note'>Did you mean '{corrected_message}'?</p>" if was_corrected and corrected_message != user_message.lower() else ""
-
-        logging.debug(f"Processing query: {user_message}, Intent: {intent}, Keywords: {keywords}")
-
-        if intent == "accidents" or user_message.lower() in ["accidents", "accident", "accidents services"]:
-            logging.debug("Handling accidents intent")
-            content = adjust_to_100_words("Stolmeier Law handles various accident cases in San Antonio, including Car Accidents, Truck Accidents, and Motorcycle Accidents. Please specify a service for details.")
-            response = {'message': correction_note + content if correction_note else content}
-            return jsonify({'response': response, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'})
-
-        if intent == "contact" or user_message.lower() in [
-            "contact us", "contact", "phone", "email", "address", "contact in email, address, phone no",
-            "are you available in [city/state]", "what areas do you serve", "can i speak with someone now",
-            "can i talk to a lawyer right now", "what’s the fastest way to get help", "how do i schedule a consultation",
-            "where are you located", "what is your email", "how to reach you"
-        ]:
-            logging.debug("Contact intent detected")
-            content = fallback_content['Contact Us']
-            store_content("Contact Us", MAIN_URL, "contact", content)
-            store_contact_info(content)
-            response = {'message': correction_note + content if correction_note else content}
-            return jsonify({'response': response, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'})
-
-        if intent == "feedback" or user_message.lower() in ["yes", "no"]:
-            logging.debug(f"Feedback for session {session_id}: {user_message}")
-            memory.clear()
-            content = adjust_to_100_words("Thank you for your feedback! Ask about services like Car Accidents, Motorcycle Accidents, or Contact Us for more information.")
-            response = {'message': correction_note + content if correction_note else content}
-            return jsonify({'response': response, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'})
+        payload, correction_note = route_query(user_message, session_id)
+        if payload is not None:
+            return jsonify(payload)
 
-        if intent == "service" and keywords and keywords[0] in service_titles.values():
-            original_title = keywords[0]
-            try:
-                section_url = website_map.get(original_title, {}).get('url', MAIN_URL)
-                content = get_content(original_title, 'description')
-                if not content or content.startswith("Sorry,") or len(content.split()) < 30:
-                    logging.debug(f"Scraping description for {original_title}")
-                    content = scrape_targeted_content([original_title], 'description', session_id, section_url, website_map)
-                    if content and not content.startswith("Sorry,") and "lorem ipsum" not in content.lower():
-                        content = adjust_to_100_words(content)
-                        store_content(original_title, section_url, 'description', content)
-                    else:
-                        logging.warning(f"Scraping failed for {original_title}. Using fallback.")
-                        content = adjust_to_100_words(fallback_content.get(original_title, f"Our team will reach you soon regarding {original_title}. Contact 210-227-3612."), is_fallback=True, keyword=original_title)
-                        store_content(original_title, section_url, 'description', content)
-                else:
-                    content = adjust_to_100_words(content)
-                response = {'message': correction_note + content if correction_note else content}
-                return jsonify({'response': response, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'})
-            except Exception as e:
-                logging.error(f"Error processing service {original_title}: {str(e)}")
-                content = adjust_to_100_words(fallback_content.get(original_title, f"Our team will reach you soon regarding {original_title}. Contact 210-227-3612."), is_fallback=True, keyword=original_title)
-                response = {'message': correction_note + content if correction_note else content}
-                return jsonify({'response': response, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'})
-
-        if intent == "subsection" and keywords:
-            question_mappings = {
-                'what to do after a car accident': ('Car Accidents', 'what to do'),
-                'do i have a case if the other driver doesn’t have insurance': ('Car Accidents', 'uninsured driver'),
-                'how long do i have to file a claim after a car accident': ('Car Accidents', 'claim deadline'),
-                'can i still file a claim if i was partially at fault': ('Car Accidents', 'partial fault'),
-                'i’m hurt and can’t work. can i get compensation for lost wages': ('Medical and Injury', 'lost wages'),
-                'what kind of injuries qualify for a personal injury claim': ('Medical and Injury', 'qualifying injuries'),
-                'do i need to see a doctor before contacting a lawyer': ('Medical and Injury', 'doctor visit'),
-                'do i need a lawyer for a personal injury claim': ('Legal Process', 'need lawyer'),
-                'how much is my case worth': ('Legal Process', 'case value'),
-                'how long will my case take': ('Legal Process', 'case duration'),
-                'what’s the process for filing a claim': ('Legal Process', 'filing process'),
-                'will i have to go to court': ('Legal Process', 'court'),
-                'how much does it cost to hire your firm': ('Fees and Costs', 'cost'),
-                'do you offer free consultations': ('Fees and Costs', 'free consultation'),
-                'do you work on a contingency fee basis': ('Fees and Costs', 'contingency'),
-                'what happens if i lose my case': ('Fees and Costs', 'losing case'),
-                'can someone review my case': ('Case Evaluation', 'review'),
-                'how do i know if i have a strong claim': ('Case Evaluation', 'strong claim'),
-                'what documents do i need to provide': ('Case Evaluation', 'documents'),
-                'do you handle slip and fall injuries': ('Specific Case Types', 'slip and fall'),
-                'can i sue for a workplace injury': ('Specific Case Types', 'workplace injury'),
-                'do you take motorcycle accident cases': ('Specific Case Types', 'motorcycle accidents'),
-                'can i file a claim for a dog bite': ('Specific Case Types', 'dog bite'),
-                'are you available in [city/state]': ('Availability and Location', 'areas served'),
-                'what areas do you serve': ('Availability and Location', 'areas served'),
-                'can i speak with someone now': ('Availability and Location', 'speak now'),
-                'can i talk to a lawyer right now': ('Immediate Help', 'lawyer now'),
-                'what’s the fastest way to get help': ('Immediate Help', 'fastest help'),
-                'how do i schedule a consultation': ('Immediate Help', 'schedule consultation')
-            }
-            user_message_lower = user_message.lower()
-            matched_question = None
-            for question, (section, subsection) in question_mappings.items():
-                if fuzz.token_set_ratio(user_message_lower, question.lower()) > 90:
-                    matched_question = (section, subsection)
-                    break
-
-            if matched_question:
-                section, subsection = matched_question
-                try:
-                    section_url = website_map.get(section, {}).get('url', MAIN_URL)
-                    content = get_content(f"{section} - {subsection.capitalize()}", subsection)
-                    if not content or content.startswith("Sorry,") or len(content.strip()) < 5:
-                        logging.debug(f"Scraping {subsection} for {section}")
-                        content = scrape_targeted_content([subsection, section], subsection, session_id, section_url, website_map)
-                        if content and not content.startswith("Sorry,") and "lorem ipsum" not in content.lower():
-                            store_content(f"{section} - {subsection.capitalize()}", section_url, subsection, content)
-                        else:
-                            content = subsection_fallbacks.get(f"{section} - {subsection.capitalize()}", f"Our team will reach you soon regarding {subsection}. Contact 210-227-3612.")
-                            store_content(f"{section} - {subsection.capitalize()}", section_url, subsection, content)
-                    content = format_list_response(content, subsection)
-                    response = {'message': correction_note + content if correction_note else content}
-                    return jsonify({'response': response, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'})
-                except Exception as e:
-                    logging.error(f"Error processing subsection query {section} - {subsection}: {str(e)}")
-                    content = format_list_response(subsection_fallbacks.get(f"{section} - {subsection.capitalize()}", f"Our team will reach you soon regarding {subsection}. Contact 210-227-3612."), subsection)
-                    response = {'message': correction_note + content if correction_note else content}
-                    return jsonify({'response': response, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'})
-            else:
-                matched_title = next((title for title in service_titles.values() if title.lower() in corrected_message.lower()), None)
-                if not matched_title:
-                    matched_title = "Car Accidents" if "accident" in corrected_message.lower() else "General"
-                subsection_query = keywords[0].lower() if keywords else None
-                try:
-                    section_url = website_map.get(matched_title, {}).get('url', MAIN_URL)
-                    content = get_content(f"{matched_title} - {subsection_query.capitalize()}", subsection_query)
-                    if not content or content.startswith("Sorry,") or len(content.strip()) < 5:
-                        logging.debug(f"Scraping {subsection_query} for {matched_title}")
-                        content = scrape_targeted_content([subsection_query, matched_title], subsection_query, session_id, section_url, website_map)
-                        if content and not content.startswith("Sorry,") and "lorem ipsum" not in content.lower():
-                            store_content(f"{matched_title} - {subsection_query.capitalize()}", section_url, subsection_query, content)
-                        else:
-                            content = subsection_fallbacks.get(f"{matched_title} - {subsection_query.capitalize()}", f"Our team will reach you soon regarding {subsection_query}. Contact 210-227-3612.")
-                            store_content(f"{matched_title} - {subsection_query.capitalize()}", section_url, subsection_query, content)
-                    content = format_list_response(content, subsection_query)
-                    response = {'message': correction_note + content if correction_note else content}
-                    return jsonify({'response': response, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'})
-                except Exception as e:
-                    logging.error(f"Error processing subsection query {matched_title} - {subsection_query}: {str(e)}")
-                    content = format_list_response(subsection_fallbacks.get(f"{matched_title} - {subsection_query.capitalize()}", f"Our team will reach you soon regarding {subsection_query}. Contact 210-227-3612."), subsection_query)
-                    response = {'message': correction_note + content if correction_note else content}
-                    return jsonify({'response': response, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'})
-
-        # Fallback for general queries
         try:
             logging.debug("Falling back to LangChain for general query")
-            result = conversational_chain({"question": user_message})
-            content = adjust_to_100_words(result["answer"], is_fallback=True, keyword=user_message)
-            response = {'message': correction_note + content if correction_note else content}
-            return jsonify({'response': response, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'})
+            result = conversational_chain({"question": user_message, "chat_history": session_memory.get_history(session_id)})
+            session_memory.add_turn(session_id, user_message, result["answer"])
+            return jsonify(format_general_answer(user_message, result["answer"], correction_note))
         except Exception as e:
             logging.error(f"Error with LangChain for general query: {str(e)}")
             content = adjust_to_100_words("Our team will reach you soon. Contact Stolmeier Law at 210-227-3612 or chris@stolmeierlaw.com.", is_fallback=True, keyword=user_message)
@@ -462,9 +718,51 @@ def rag_query():
         content = "Our team will reach you soon. Contact Stolmeier Law at 210-227-3612 or chris@stolmeierlaw.com."
         return jsonify({'response': {'message': content}, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'})
 
+@app.route('/rag_query/stream', methods=['POST'])
+def rag_query_stream():
+    """Stream the answer as server-sent events: 'token' events while the LLM generates, then one 'done' event with the full response."""
+    data = request.get_json(silent=True) or {}
+    user_message = data.get('message', '').strip()
+    session_id = data.get('session_id', 'default')
+
+    def events():
+        if not user_message:
+            logging.error("No message received")
+            yield sse_event('done', {'error': 'Please provide a question or select a service.'})
+            return
+        try:
+            payload, correction_note = route_query(user_message, session_id)
+        except Exception as e:
+            logging.error(f"Unexpected error in rag_query_stream: {str(e)}\n{traceback.format_exc()}")
+            yield sse_event('done', {'response': {'message': "Our team will reach you soon. Contact Stolmeier Law at 210-227-3612 or chris@stolmeierlaw.com."}, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'})
+            return
+        if payload is not None:
+            yield sse_event('done', payload)
+            return
+
+        chunks = []
+        try:
+            logging.debug("Streaming LangChain answer for general query")
+            if correction_note:
+                yield sse_event('token', {'text': correction_note, 'html': True})
+            # Tokens show the raw answer as it arrives; 'done' carries the final text (trimmed, or the fallback for a short answer)
+            for text in capped_answer_chunks(stream_chain_answer(conversational_chain, user_message, session_memory.get_history(session_id)), chunks):
+                yield sse_event('token', {'text': text})
+            answer = ''.join(chunks)
+            session_memory.add_turn(session_id, user_message, answer)
+            yield sse_event('done', format_general_answer(user_message, answer, correction_note))
+        except Exception as e:
+            logging.error(f"Error streaming LangChain answer for general query: {str(e)}")
+            content = adjust_to_100_words("Our team will reach you soon. Contact Stolmeier Law at 210-227-3612 or chris@stolmeierlaw.com.", is_fallback=True, keyword=user_message)
+            response = {'message': correction_note + content if correction_note else content}
+            yield sse_event('done', {'response': response, 'helpful_prompt': 'Was this helpful? (Reply "yes" or "no")'})
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 if __name__ == '__main__':
     try:
         init_db()  # Initialize database
+        start_warmup()  # Load the website map, index and LLM while the server starts accepting requests
         app.run(debug=True, port=5001, use_reloader=False)
     except Exception as e:
         logging.error(f"Error running app: {str(e)}\n{traceback.format_exc()}")
@@ -0,0 +1,179 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import time
+from nlp import (
+    configure_intent_cache, extract_keywords_and_intent, extract_keywords_and_intent_batch,
+    get_intent_index, subsection_queries, synonyms
+)
+from scraper import default_website_map
+
+RAMBLING_PREFIXES = [
+    "hi there, sorry to bother you but i have a question about something that happened last month,",
+    "so my cousin told me to reach out because i am not really sure where to start and",
+    "hello, i was reading your website earlier tonight and i wanted to ask",
+]
+RAMBLING_SUFFIXES = [
+    "and i really appreciate any help you can give me with all of this",
+    "because honestly i have no idea what the next step is and it is stressing me out",
+    "thanks so much in advance, hope to hear back from someone soon",
+]
+
+
+def add_typos(text, rng, rate=0.15):
+    """Inject single-character deletions, substitutions and duplications into longer words."""
+    words = []
+    for word in text.split():
+        if len(word) > 3 and rng.random() < rate:
+            position = rng.randrange(len(word))
+            edit = rng.randrange(3)
+            if edit == 0:
+                word = word[:position] + word[position + 1:]
+            elif edit == 1:
+                word = word[:position] + rng.choice('abcdefghijklmnopqrstuvwxyz') + word[position + 1:]
+            else:
+                word = word[:position] + word[position] + word[position:]
+        words.append(word)
+    return ' '.join(words)
+
+
+def build_corpus(website_map, seed=0, typo_variants=3):
+    """Generate labelled (category, message, expected intent, expected keywords) cases from the routing tables."""
+    rng = random.Random(seed)
+    index = get_intent_index(website_map)
+    seeds = []
+    for title in website_map:
+        seeds.append(('service_title', title, 'service', [title]))
+    for phrase in synonyms:
+        keywords, intent = index.synonym_routes[phrase]
+        seeds.append(('synonym', phrase, intent, keywords))
+    for question, (intent, keywords) in subsection_queries.items():
+        seeds.append(('canonical_question', question, intent, keywords))
+
+    cases = list(seeds)
+    for category, message, intent, keywords in seeds:
+        for _ in range(typo_variants):
+            cases.append((f"{category}_typo", add_typos(message, rng), intent, keywords))
+        if category == 'canonical_question':
+            if "’" in message:
+                cases.append(('straight_apostrophe', message.replace("’", "'"), intent, keywords))
+            else:
+                cases.append(('curly_apostrophe', message.replace("'", "’"), intent, keywords))
+            cases.append(('question_mark', message.capitalize() + '?', intent, keywords))
+            cases.append(('rambling', f"{rng.choice(RAMBLING_PREFIXES)} {message} {rng.choice(RAMBLING_SUFFIXES)}", intent, keywords))
+    return cases
+
+
+def percentile(sorted_values, fraction):
+    """Return the nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def run_benchmark(cases, website_map, repeat=3, cache_size=0):
+    """Time single-message and batch extraction over the corpus and score routing accuracy."""
+    configure_intent_cache(cache_size)
+    messages = [message for _, message, _, _ in cases]
+    latencies = []
+    results = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(repeat):
+        results = []
+        for message in messages:
+            started = time.perf_counter()
+            results.append(extract_keywords_and_intent(message, 'benchmark', website_map, {}))
+            latencies.append((time.perf_counter() - started) * 1000)
+    wall_elapsed = time.perf_counter() - wall_start
+    cpu_elapsed = time.process_time() - cpu_start
+
+    configure_intent_cache(cache_size)
+    batch_start = time.perf_counter()
+    batch_results = extract_keywords_and_intent_batch(messages, 'benchmark', website_map, {})
+    batch_elapsed = time.perf_counter() - batch_start
+
+    per_category = {}
+    correct = 0
+    for (category, message, intent, keywords), result in zip(cases, results):
+        hit = result[1] == intent and list(result[0]) == list(keywords)
+        correct += hit
+        totals = per_category.setdefault(category, {'cases': 0, 'correct': 0})
+        totals['cases'] += 1
+        totals['correct'] += hit
+    for totals in per_category.values():
+        totals['accuracy'] = totals['correct'] / totals['cases']
+
+    latencies.sort()
+    calls = len(latencies)
+    return {
+        'cases': len(cases),
+        'repeat': repeat,
+        'cache_size': cache_size,
+        'latency_ms': {
+            'mean': sum(latencies) / calls if calls else 0.0,
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'max': latencies[-1] if latencies else 0.0
+        },
+        'throughput_per_core': calls / cpu_elapsed if cpu_elapsed else 0.0,
+        'throughput_wall': calls / wall_elapsed if wall_elapsed else 0.0,
+        'batch_throughput': len(messages) / batch_elapsed if batch_elapsed else 0.0,
+        'batch_agrees': [tuple(r) for r in batch_results] == [tuple(r) for r in results],
+        'accuracy': correct / len(cases) if cases else 0.0,
+        'accuracy_by_category': dict(sorted(per_category.items()))
+    }
+
+
+def compare(report, baseline):
+    """Print the change of each headline metric against a baseline report."""
+    rows = [
+        ('latency p50 (ms)', report['latency_ms']['p50'], baseline['latency_ms']['p50']),
+        ('latency p95 (ms)', report['latency_ms']['p95'], baseline['latency_ms']['p95']),
+        ('latency p99 (ms)', report['latency_ms']['p99'], baseline['latency_ms']['p99']),
+        ('throughput/core (msg/s)', report['throughput_per_core'], baseline['throughput_per_core']),
+        ('batch throughput (msg/s)', report['batch_throughput'], baseline.get('batch_throughput', 0.0)),
+        ('accuracy', report['accuracy'], baseline['accuracy']),
+    ]
+    print(f"{'metric':<26}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, current, previous in rows:
+        change = f"{(current - previous) / previous * 100:+.1f}%" if previous else 'n/a'
+        print(f"{name:<26}{previous:>12.4f}{current:>12.4f}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark latency and routing accuracy of extract_keywords_and_intent.")
+    parser.add_argument('--repeat', type=int, default=3, help="timed passes over the corpus")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for typo and rambling variants")
+    parser.add_argument('--typo-variants', type=int, default=3, help="typo variants generated per seed phrase")
+    parser.add_argument('--cache-size', type=int, default=0, help="intent cache size during the run (0 measures uncached matching)")
+    parser.add_argument('--output', default='intent_benchmark.json', help="where to write the JSON report")
+    parser.add_argument('--baseline', help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    website_map = default_website_map()
+    cases = build_corpus(website_map, seed=args.seed, typo_variants=args.typo_variants)
+    report = run_benchmark(cases, website_map, repeat=args.repeat, cache_size=args.cache_size)
+    report['environment'] = {'python': platform.python_version(), 'machine': platform.machine(), 'cpus': os.cpu_count()}
+    report['seed'] = args.seed
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"{report['cases']} cases x {report['repeat']}: p50 {report['latency_ms']['p50']:.3f} ms, "
+          f"p95 {report['latency_ms']['p95']:.3f} ms, p99 {report['latency_ms']['p99']:.3f} ms, "
+          f"{report['throughput_per_core']:.0f} msg/s per core, accuracy {report['accuracy']:.3f}")
+    print(f"Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
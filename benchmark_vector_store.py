@@ -0,0 +1,153 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from benchmark_intent import percentile
+from database import iter_content
+from vector_index import VECTOR_BACKENDS, open_vector_store
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic pseudo-embeddings for timing the stores without downloading a model."""
+
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def _embed(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+        vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def memory_usage():
+    """Return resident memory in MB, split into anonymous (private) and file-backed (shareable) pages where /proc allows."""
+    usage = {}
+    try:
+        with open('/proc/self/status', encoding='utf-8') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in ('VmRSS', 'RssAnon', 'RssFile'):
+                    usage[name] = int(value.split()[0]) / 1024
+    except OSError:
+        usage['VmRSS'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return usage
+
+
+def corpus_documents(copies):
+    """Yield the content.db rows as documents, repeated copies times under distinct page titles to scale the corpus."""
+    rows = list(iter_content())
+    if not rows:
+        raise SystemExit("content.db has no content; run the app once to fill it")
+    for copy in range(copies):
+        for page_title, url, content_type, content in rows:
+            yield Document(page_content=content, metadata={'page_title': f"{page_title} #{copy}", 'content_type': content_type, 'url': url or ''})
+
+
+def make_embeddings(model):
+    """Return hash embeddings, or the named sentence-transformers model."""
+    if model == 'hash':
+        return HashEmbeddings()
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=model)
+
+
+def run_child(args):
+    """Open (building if needed) one backend's store in this process and time vector queries against it."""
+    logging.disable(logging.CRITICAL)
+    embeddings = make_embeddings(args.embedding_model)
+    rng = random.Random(args.seed)
+    queries = [embeddings.embed_query(' '.join(rng.choice(['car', 'truck', 'injury', 'claim', 'deadline', 'dog', 'bite', 'fault', 'lawyer', 'fee']) for _ in range(6)))
+               for _ in range(args.queries)]
+    before = memory_usage()
+    started = time.perf_counter()
+    vector_store = open_vector_store(corpus_documents(args.copies), embeddings, args.embedding_model, args.directory, backend=args.child)
+    open_seconds = time.perf_counter() - started
+    for vector in queries[:10]:
+        vector_store.similarity_search_by_vector(vector, k=args.k)
+    latencies = []
+    for vector in queries:
+        started = time.perf_counter()
+        vector_store.similarity_search_by_vector(vector, k=args.k)
+        latencies.append((time.perf_counter() - started) * 1000)
+    after = memory_usage()
+    latencies.sort()
+    print(json.dumps({
+        'open_seconds': open_seconds,
+        'latency_ms': {
+            'mean': sum(latencies) / len(latencies),
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99)
+        },
+        'rss_mb': after,
+        'rss_growth_mb': {name: after[name] - before.get(name, 0.0) for name in after}
+    }))
+
+
+def measure(backend, args, directory):
+    """Run a child process for backend and return its JSON report."""
+    command = [
+        sys.executable, os.path.abspath(__file__), '--child', backend, '--directory', directory,
+        '--copies', str(args.copies), '--queries', str(args.queries), '--k', str(args.k),
+        '--embedding-model', args.embedding_model, '--seed', str(args.seed)
+    ]
+    completed = subprocess.run(command, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare query latency, open time and memory of the Chroma and FAISS vector store backends.")
+    parser.add_argument('--backends', nargs='+', default=list(VECTOR_BACKENDS), choices=VECTOR_BACKENDS, help="backends to compare")
+    parser.add_argument('--copies', type=int, default=1, help="repeat the content.db rows this many times to scale the corpus")
+    parser.add_argument('--queries', type=int, default=500, help="timed similarity searches per backend")
+    parser.add_argument('--k', type=int, default=2, help="documents returned per search (the app's retriever uses 2)")
+    parser.add_argument('--embedding-model', default='hash', help="'hash' for offline pseudo-embeddings, or a sentence-transformers model such as all-MiniLM-L6-v2")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for the query texts")
+    parser.add_argument('--output', default='vector_store_benchmark.json', help="where to write the JSON report")
+    parser.add_argument('--child', choices=VECTOR_BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument('--directory', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    report = {'copies': args.copies, 'queries': args.queries, 'k': args.k, 'embedding_model': args.embedding_model, 'backends': {}}
+    for backend in args.backends:
+        with tempfile.TemporaryDirectory(prefix=f"vector-{backend}-") as directory:
+            build = measure(backend, args, directory)
+            boot = measure(backend, args, directory)
+        report['backends'][backend] = {'build_seconds': build['open_seconds'], 'boot_seconds': boot['open_seconds'],
+                                       'latency_ms': boot['latency_ms'], 'rss_mb': boot['rss_mb'], 'rss_growth_mb': boot['rss_growth_mb']}
+    report['environment'] = {'python': platform.python_version(), 'machine': platform.machine(), 'cpus': os.cpu_count()}
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"{'backend':<12}{'build s':>10}{'boot s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'RSS MB':>10}{'anon MB':>10}{'file MB':>10}")
+    for backend, result in report['backends'].items():
+        rss = result['rss_mb']
+        print(f"{backend:<12}{result['build_seconds']:>10.3f}{result['boot_seconds']:>10.3f}{result['latency_ms']['p50']:>10.3f}"
+              f"{result['latency_ms']['p95']:>10.3f}{result['latency_ms']['p99']:>10.3f}{rss.get('VmRSS', 0.0):>10.1f}"
+              f"{rss.get('RssAnon', 0.0):>10.1f}{rss.get('RssFile', 0.0):>10.1f}")
+    print(f"Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+import threading
+import time
+
+
+class _Call:
+    """One in-flight call whose outcome is shared with every caller that waited on it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        """Return (call, leader): the in-flight call for key, creating it if this caller is the first."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = _Call()
+            return call, True
+
+    def _run(self, key, call, func, args):
+        """Execute func as the leader, publish its outcome and release the key."""
+        try:
+            call.result = func(*args)
+        except Exception as e:
+            call.error = e
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def do(self, key, func, *args):
+        """Run func(*args), or wait for the call already in flight for key; both return (or raise) its outcome."""
+        call, leader = self._join(key)
+        if leader:
+            self._run(key, call, func, args)
+        else:
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def try_do(self, key, func, *args):
+        """Run func(*args) unless a call for key is in flight; returns (True, result), or (False, None) without waiting."""
+        call, leader = self._join(key)
+        if not leader:
+            return False, None
+        self._run(key, call, func, args)
+        if call.error is not None:
+            raise call.error
+        return True, call.result
+
+    def in_flight(self, key):
+        """Return True while a call for key is running."""
+        with self._lock:
+            return key in self._calls
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker that spaces recovery attempts with exponential backoff."""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=1, base_delay=5.0, max_delay=300.0, multiplier=2.0):
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a call may proceed; an open breaker lets one trial call through once its delay has passed."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() >= self.retry_at:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        """Close the breaker and reset the backoff."""
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.trips = 0
+
+    def record_failure(self):
+        """Count a failure, opening the breaker (with a longer delay each time) once the threshold is reached."""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                delay = min(self.max_delay, self.base_delay * self.multiplier ** self.trips)
+                self.trips += 1
+                self.state = self.OPEN
+                self.retry_at = time.monotonic() + delay
+
+    def retry_in(self):
+        """Return the seconds until an open breaker allows its next trial call."""
+        with self._lock:
+            return max(0.0, self.retry_at - time.monotonic()) if self.state == self.OPEN else 0.0
+
+    def snapshot(self):
+        """Return the breaker state as a plain dict."""
+        retry_in = self.retry_in()
+        with self._lock:
+            return {'state': self.state, 'failures': self.failures, 'trips': self.trips, 'retry_in': round(retry_in, 1)}
+
+
+class _Batch:
+    """Items gathered for one batched call, with one pending call per item."""
+
+    def __init__(self):
+        self.items = []
+        self.calls = []
+        self.full = threading.Event()
+
+
+class MicroBatcher:
+    """Gather items submitted within a short window into one batched call and hand each caller its own result."""
+
+    def __init__(self, func, max_batch=8, max_wait=0.02):
+        self.func = func
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.items = 0
+        self.largest = 0
+        self._open = None
+        self._lock = threading.Lock()
+
+    def submit(self, item):
+        """Add item to the open batch and wait for its result; the first caller of a batch waits up to max_wait, then runs it."""
+        call = _Call()
+        with self._lock:
+            batch = self._open
+            leader = batch is None
+            if leader:
+                batch = self._open = _Batch()
+            batch.items.append(item)
+            batch.calls.append(call)
+            if len(batch.items) >= self.max_batch:
+                self._open = None
+                batch.full.set()
+        if leader:
+            batch.full.wait(self.max_wait)
+            with self._lock:
+                if self._open is batch:
+                    self._open = None
+            self._run(batch)
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _run(self, batch):
+        """Call func on the batch's items and publish each result, or the error, to its caller."""
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch.items)
+            self.largest = max(self.largest, len(batch.items))
+        try:
+            results = list(self.func(batch.items))
+            if len(results) != len(batch.items):
+                raise ValueError(f"Batched call returned {len(results)} results for {len(batch.items)} items")
+            for call, result in zip(batch.calls, results):
+                call.result = result
+        except Exception as e:
+            for call in batch.calls:
+                call.error = e
+        finally:
+            for call in batch.calls:
+                call.done.set()
+
+    def stats(self):
+        """Return batch counters as a plain dict."""
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'largest': self.largest,
+                'mean_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+                'max_batch': self.max_batch,
+                'max_wait_ms': self.max_wait * 1000
+            }
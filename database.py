@@ -1,13 +1,59 @@
+import os
 import sqlite3
 import logging
+import threading
+from contextlib import closing
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Content versions live in content.db (meta and page_versions), bumped in the same transaction as the write that changes
+# content, so every process sees a change made by any other; each thread keeps a read connection to check them cheaply
+_version_readers = threading.local()
+
+def _version_connection():
+    """Return this thread's read connection to content.db, reopened if the working directory moved to another database."""
+    path = os.path.abspath('content.db')
+    if getattr(_version_readers, 'path', None) != path:
+        if getattr(_version_readers, 'conn', None) is not None:
+            _version_readers.conn.close()
+        _version_readers.conn = sqlite3.connect(path)
+        _version_readers.path = path
+    return _version_readers.conn
+
+def get_content_version(page_title=None):
+    """Return the content version of the whole table, or of one page title's rows."""
+    try:
+        conn = _version_connection()
+        if page_title is None:
+            rows = conn.execute('SELECT content_version FROM meta WHERE id = 1').fetchall()
+        else:
+            rows = conn.execute(
+                'SELECT max(coalesce((SELECT version FROM page_versions WHERE page_title = ?), 0), cleared_version) FROM meta WHERE id = 1',
+                (page_title,)
+            ).fetchall()
+        return rows[0][0] if rows else 0
+    except Exception as e:
+        logging.error(f"Error reading content version: {str(e)}")
+        return 0
+
+def _bump_content_version(cursor, page_title=None):
+    """Record, inside the caller's transaction, that stored content changed for one page title or (when None) for every page."""
+    if page_title is None:
+        cursor.execute('UPDATE meta SET content_version = content_version + 1, cleared_version = content_version + 1 WHERE id = 1')
+        cursor.execute('DELETE FROM page_versions')
+    else:
+        cursor.execute('UPDATE meta SET content_version = content_version + 1 WHERE id = 1')
+        cursor.execute('''
+            INSERT INTO page_versions (page_title, version) VALUES (?, (SELECT content_version FROM meta WHERE id = 1))
+            ON CONFLICT (page_title) DO UPDATE SET version = excluded.version
+        ''', (page_title,))
+
 def init_db():
     """Initialize the SQLite database."""
     try:
         with sqlite3.connect('content.db') as conn:
             cursor = conn.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')  # readers and the writer no longer block each other
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS content (
                     page_title TEXT,
@@ -23,6 +69,20 @@ def init_db():
                     contact_text TEXT
                 )
             ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS meta (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    content_version INTEGER NOT NULL,
+                    cleared_version INTEGER NOT NULL
+                )
+            ''')
+            cursor.execute('INSERT OR IGNORE INTO meta (id, content_version, cleared_version) VALUES (1, 0, 0)')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS page_versions (
+                    page_title TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                )
+            ''')
             conn.commit()
             logging.debug("Database initialized successfully.")
     except Exception as e:
@@ -35,6 +95,7 @@ def clear_database():
             cursor = conn.cursor()
             cursor.execute('DELETE FROM content')
             cursor.execute('DELETE FROM contact_info')
+            _bump_content_version(cursor)
             conn.commit()
             logging.debug("Database cleared successfully.")
     except Exception as e:
@@ -56,17 +117,52 @@ def get_content(page_title, content_type):
         logging.error(f"Error retrieving content: {str(e)}")
         return None
 
+def iter_content(content_types=None, page_size=100):
+    """Yield (page_title, url, content_type, content) rows, optionally only of the given content types, a page at a time.
+
+    Each page is a short query on its own connection, keyed on the last (page_title, content_type) seen,
+    so no read stays open while the caller works through the rows and writers are never held up by it.
+    Errors are raised rather than logged: a silently shortened read would look like deleted content to the indexer.
+    """
+    filters = []
+    params = []
+    if content_types is not None:
+        content_types = list(content_types)
+        filters.append(f"content_type IN ({', '.join('?' * len(content_types))})")
+        params.extend(content_types)
+    last_key = None
+    while True:
+        conditions = filters + (['(page_title, content_type) > (?, ?)'] if last_key else [])
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        with closing(sqlite3.connect('content.db')) as conn:
+            rows = conn.execute(
+                f'SELECT page_title, url, content_type, content FROM content{where} ORDER BY page_title, content_type LIMIT ?',
+                params + list(last_key or ()) + [page_size]
+            ).fetchall()
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last_key = rows[-1][0], rows[-1][2]
+
 def store_content(page_title, url, content_type, content):
     """Store content in the database."""
     try:
         with sqlite3.connect('content.db') as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                INSERT OR REPLACE INTO content (page_title, url, content_type, content)
+                INSERT INTO content (page_title, url, content_type, content)
                 VALUES (?, ?, ?, ?)
+                ON CONFLICT (page_title, content_type) DO UPDATE SET url = excluded.url, content = excluded.content
+                WHERE url IS NOT excluded.url OR content IS NOT excluded.content
             ''', (page_title, url, content_type, content))
+            changed = cursor.rowcount > 0
+            if changed:
+                _bump_content_version(cursor, page_title)
             conn.commit()
-            logging.debug(f"Stored content for {page_title} ({content_type})")
+            if changed:
+                logging.debug(f"Stored content for {page_title} ({content_type})")
+            else:
+                logging.debug(f"Content unchanged for {page_title} ({content_type})")
     except Exception as e:
         logging.error(f"Error storing content: {str(e)}")
 
@@ -0,0 +1,152 @@
+import inspect
+import logging
+import os
+import shutil
+import tempfile
+import numpy as np
+import onnxruntime
+from langchain_core.embeddings import Embeddings
+from transformers import AutoTokenizer
+from concurrency import MicroBatcher
+
+
+class BatchedEmbeddings(Embeddings):
+    """Embeddings whose concurrent embed_query calls are gathered into one embed_documents call."""
+
+    def __init__(self, embeddings, max_batch=32, max_wait=0.01):
+        self.embeddings = embeddings
+        self.batcher = MicroBatcher(embeddings.embed_documents, max_batch=max_batch, max_wait=max_wait)
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.batcher.submit(text)
+
+
+class BatchedPipeline:
+    """Transformers pipeline wrapper that runs concurrent single-prompt calls as one padded batch."""
+
+    def __init__(self, pipeline, max_batch=8, max_wait=0.02):
+        self.pipeline = pipeline
+        self.batcher = MicroBatcher(self._run_batch, max_batch=max_batch, max_wait=max_wait)
+
+    def _run_batch(self, calls):
+        """Generate for (prompt, kwargs) calls with one pipeline call per distinct kwargs, returning one output per call."""
+        groups = []
+        for position, (_, kwargs) in enumerate(calls):
+            for group_kwargs, positions in groups:
+                if group_kwargs == kwargs:
+                    positions.append(position)
+                    break
+            else:
+                groups.append((kwargs, [position]))
+        outputs = [None] * len(calls)
+        for kwargs, positions in groups:
+            results = self.pipeline([calls[position][0] for position in positions], batch_size=len(positions), **kwargs)
+            for position, output in zip(positions, results):
+                outputs[position] = output[0] if isinstance(output, list) else output
+        return outputs
+
+    def __call__(self, inputs, **kwargs):
+        if not isinstance(inputs, list) or len(inputs) != 1 or 'batch_size' in kwargs:
+            return self.pipeline(inputs, **kwargs)
+        return [self.batcher.submit((inputs[0], kwargs))]
+
+    def __getattr__(self, name):
+        return getattr(self.pipeline, name)
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence-transformers MiniLM served by ONNX Runtime: mean pooling over the attention mask, then L2 normalization.
+
+    The model is exported to ONNX on first use (this needs torch) and optionally int8-quantized; later starts only load the file.
+    """
+
+    def __init__(self, model_name, cache_dir, quantize=False, threads=None, max_length=256, batch_size=32):
+        self.model_name = model_name
+        self.max_length = max_length
+        self.batch_size = batch_size
+        directory = os.path.join(cache_dir, model_name.replace('/', '--'))
+        if not os.path.exists(os.path.join(directory, 'model.onnx')):
+            export_onnx(model_name, directory)
+        model_path = os.path.join(directory, 'model.onnx')
+        if quantize:
+            model_path = os.path.join(directory, 'model-int8.onnx')
+            if not os.path.exists(model_path):
+                quantize_onnx(os.path.join(directory, 'model.onnx'), model_path)
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads or min(4, os.cpu_count() or 1)
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+        logging.debug(f"ONNX embeddings loaded from {model_path} with {options.intra_op_num_threads} threads")
+
+    def _embed(self, texts):
+        """Embed one batch of texts."""
+        tokens = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors='np')
+        inputs = {name: tokens[name].astype(np.int64) for name in self.input_names}
+        hidden = self.session.run(['last_hidden_state'], inputs)[0]
+        mask = tokens['attention_mask'][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts):
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed(list(texts[start:start + self.batch_size])).tolist())
+        return vectors
+
+    def embed_query(self, text):
+        return self._embed([text])[0].tolist()
+
+
+def hub_model_id(model_name):
+    """Resolve a bare sentence-transformers name such as all-MiniLM-L6-v2 the way sentence-transformers does."""
+    if os.path.isdir(model_name) or '/' in model_name:
+        return model_name
+    return f"sentence-transformers/{model_name}"
+
+
+def export_onnx(model_name, directory, opset=14):
+    """Export a transformer encoder and its tokenizer to directory/model.onnx with dynamic batch and sequence axes."""
+    import torch  # only needed to export
+    from transformers import AutoModel
+
+    logging.debug(f"Exporting {model_name} to ONNX in {directory}")
+    tokenizer = AutoTokenizer.from_pretrained(hub_model_id(model_name))
+    model = AutoModel.from_pretrained(hub_model_id(model_name)).eval()
+    sample = tokenizer(['Stolmeier Law handles car accident claims.'], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names + ['last_hidden_state']}
+    # Newer torch defaults to the dynamo exporter (which needs onnxscript); the TorchScript one handles these encoders fine
+    export_options = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+    os.makedirs(os.path.dirname(os.path.abspath(directory)), exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='onnx-export-', dir=os.path.dirname(os.path.abspath(directory)))
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                model, tuple(sample[name] for name in input_names), os.path.join(staging, 'model.onnx'),
+                input_names=input_names, output_names=['last_hidden_state'], dynamic_axes=dynamic_axes, opset_version=opset,
+                **export_options
+            )
+        tokenizer.save_pretrained(staging)
+        os.replace(staging, directory)
+    except OSError:
+        if not os.path.exists(os.path.join(directory, 'model.onnx')):
+            raise
+        logging.debug(f"ONNX export of {model_name} already written by another process")
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def quantize_onnx(model_path, quantized_path):
+    """Write an int8 dynamically quantized copy of an ONNX model (needs the onnx package)."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    logging.debug(f"Quantizing {model_path} to int8")
+    staging = f"{quantized_path}.{os.getpid()}.tmp"
+    quantize_dynamic(model_path, staging, weight_type=QuantType.QInt8)
+    os.replace(staging, quantized_path)
@@ -1,254 +1,936 @@
+import itertools
+import json
 import logging
-from thefuzz import fuzz, process
+import os
+from collections import Counter, deque
+import numpy as np
+from rapidfuzz import fuzz as rfuzz, process as rprocess
+from rapidfuzz.distance import OSA
+from thefuzz.utils import full_process
+from cache import LRUCache
+from concurrency import SingleFlight
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
+_TEXT_FOLDS = str.maketrans({
+    '‘': "'", '’': "'", '‚': "'", '‛': "'", '′': "'", '`': "'", '´': "'",
+    '“': '"', '”': '"', '„': '"', '‟': '"', '″': '"',
+    '‐': '-', '‑': '-', '‒': '-', '–': '-', '—': '-', '―': '-', '−': '-',
+    '\u00a0': ' ', '\u2009': ' ', '\u200b': ''
+})
+_TRAILING_PUNCTUATION = ' .,;:!?'
+
+
+def normalize_message(text):
+    """Lowercase text, fold Unicode quotes and dashes, collapse whitespace and strip trailing punctuation."""
+    return ' '.join(text.translate(_TEXT_FOLDS).lower().split()).rstrip(_TRAILING_PUNCTUATION)
+
+
+synonyms = {
+    'slip fall': 'slip trip fall',
+    'slip and fall': 'slip trip fall',
+    'dog bite': 'dog bites & attacks',
+    'dog attack': 'dog bites & attacks',
+    'product defect': 'product liability',
+    'medical error': 'medical malpractice',
+    'med mal': 'medical malpractice',
+    'contact': 'contact us',
+    'phone': 'contact us',
+    'email': 'contact us',
+    'address': 'contact us',
+    'crash': 'car accidents',
+    'car crash': 'car accidents',
+    'auto accident': 'car accidents',
+    'attorney': 'contact us',
+    'lawyer': 'contact us',
+    'consultation': 'contact us',
+    'free consultation': 'fees and costs',
+    'contingency fee': 'fees and costs',
+    'case worth': 'legal process',
+    'case value': 'legal process',
+    'case duration': 'legal process',
+    'court case': 'legal process',
+    'filing claim': 'legal process',
+    'lost wages': 'medical and injury',
+    'personal injury': 'medical and injury',
+    'injury claim': 'medical and injury',
+    'doctor visit': 'medical and injury',
+    'case review': 'case evaluation',
+    'strong claim': 'case evaluation',
+    'claim documents': 'case evaluation',
+    'workplace injury': 'specific case types',
+    'motorcycle accident': 'specific case types',
+    'areas served': 'availability and location',
+    'speak now': 'availability and location',
+    'lawyer now': 'immediate help',
+    'fastest help': 'immediate help',
+    'schedule consultation': 'immediate help',
+    'causes': 'causes',
+    'reasons': 'causes',
+    'why accidents': 'causes',
+    'what to do': 'what to do',
+    'steps after': 'what to do',
+    'post-accident': 'what to do',
+    'after accident': 'what to do',
+    'injury': 'injuries',
+    'injuries': 'injuries',
+    'hurt': 'injuries',
+    'wounds': 'injuries',
+    'insurance': 'uninsured driver',
+    'uninsured': 'uninsured driver',
+    'time limit': 'claim deadline',
+    'deadline': 'claim deadline'
+}
+
+common_keywords = [
+    'causes', 'cause', 'crash', 'proving liability', 'contact info', 'phone', 'email', 'address', 
+    'yes', 'no', 'what to do', 'uninsured driver', 'claim deadline', 'partial fault', 
+    'lost wages', 'qualifying injuries', 'doctor visit', 'need lawyer', 'case value', 
+    'case duration', 'filing process', 'court', 'cost', 'free consultation', 'contingency', 
+    'losing case', 'review', 'strong claim', 'documents', 'slip and fall', 
+    'workplace injury', 'motorcycle accidents', 'dog bite', 'areas served', 
+    'speak now', 'lawyer now', 'fastest help', 'schedule consultation', 'injuries',
+    'insurance', 'uninsured', 'time limit', 'deadline'
+]
+
+subsection_queries = {
+    'causes of car accidents': ('subsection', ['causes', 'Car Accidents']),
+    'what are the causes of car accidents': ('subsection', ['causes', 'Car Accidents']),
+    'reasons for car accidents': ('subsection', ['causes', 'Car Accidents']),
+    'why do car accidents happen': ('subsection', ['causes', 'Car Accidents']),
+    'what to do after a car accident': ('subsection', ['what to do', 'Car Accidents']),
+    'steps after a car accident': ('subsection', ['what to do', 'Car Accidents']),
+    'what should i do after a car crash': ('subsection', ['what to do', 'Car Accidents']),
+    'post-accident steps': ('subsection', ['what to do', 'Car Accidents']),
+    'car accident injuries': ('subsection', ['injuries', 'Car Accidents']),
+    'car accident injury': ('subsection', ['injuries', 'Car Accidents']),
+    'injuries from car accidents': ('subsection', ['injuries', 'Car Accidents']),
+    'what injuries from car accidents': ('subsection', ['injuries', 'Car Accidents']),
+    'do i have a case if the other driver doesn’t have insurance': ('subsection', ['uninsured driver', 'Car Accidents']),
+    'how long do i have to file a claim after a car accident': ('subsection', ['claim deadline', 'Car Accidents']),
+    'can i still file a claim if i was partially at fault': ('subsection', ['partial fault', 'Car Accidents']),
+    'i’m hurt and can’t work. can i get compensation for lost wages': ('subsection', ['lost wages', 'Medical and Injury']),
+    'what kind of injuries qualify for a personal injury claim': ('subsection', ['qualifying injuries', 'Medical and Injury']),
+    'do i need to see a doctor before contacting a lawyer': ('subsection', ['doctor visit', 'Medical and Injury']),
+    'do i need a lawyer for a personal injury claim': ('subsection', ['need lawyer', 'Legal Process']),
+    'how much is my case worth': ('subsection', ['case value', 'Legal Process']),
+    'how long will my case take': ('subsection', ['case duration', 'Legal Process']),
+    'what’s the process for filing a claim': ('subsection', ['filing process', 'Legal Process']),
+    'will i have to go to court': ('subsection', ['court', 'Legal Process']),
+    'how much does it cost to hire your firm': ('subsection', ['cost', 'Fees and Costs']),
+    'do you offer free consultations': ('subsection', ['free consultation', 'Fees and Costs']),
+    'do you work on a contingency fee basis': ('subsection', ['contingency', 'Fees and Costs']),
+    'what happens if i lose my case': ('subsection', ['losing case', 'Fees and Costs']),
+    'can someone review my case': ('subsection', ['review', 'Case Evaluation']),
+    'how do i know if i have a strong claim': ('subsection', ['strong claim', 'Case Evaluation']),
+    'what documents do i need to provide': ('subsection', ['documents', 'Case Evaluation']),
+    'do you handle slip and fall injuries': ('subsection', ['slip and fall', 'Specific Case Types']),
+    'can i sue for a workplace injury': ('subsection', ['workplace injury', 'Specific Case Types']),
+    'do you take motorcycle accident cases': ('subsection', ['motorcycle accidents', 'Specific Case Types']),
+    'can i file a claim for a dog bite': ('subsection', ['dog bite', 'Specific Case Types']),
+    'are you available in [city/state]': ('contact', ['Contact Us']),
+    'what areas do you serve': ('contact', ['Contact Us']),
+    'can i speak with someone now': ('contact', ['Contact Us']),
+    'can i talk to a lawyer right now': ('contact', ['Contact Us']),
+    'what’s the fastest way to get help': ('contact', ['Contact Us']),
+    'how do i schedule a consultation': ('contact', ['Contact Us']),
+    'do i have a case if the other driver doesn’t have insurance': ('subsection', ['uninsured driver', 'Car Accidents']),
+    'how long do i have to file a claim': ('subsection', ['claim deadline', 'Car Accidents'])
+}
+
+
+canonical_queries = {normalize_message(question): route for question, route in subsection_queries.items()}
+
+
+def _build_routing_table():
+    """Map each canonical question to its (intent, section, subsection, storage key) route."""
+    table = {}
+    for question, (query_intent, query_keywords) in canonical_queries.items():
+        if query_intent == 'subsection':
+            subsection, section = query_keywords
+            table[question] = (query_intent, section, subsection, f"{section} - {subsection.capitalize()}")
+        else:
+            table[question] = (query_intent, query_keywords[0], query_intent, query_keywords[0])
+    return table
+
+
+routing_table = _build_routing_table()
+
+
+def lookup_route(question):
+    """Return the route for a canonical question returned as the corrected message, or None."""
+    return routing_table.get(normalize_message(question))
+
+
+car_accident_subsections = ['causes', 'what to do', 'injuries', 'uninsured driver', 'claim deadline']
+contact_keywords = ['contact info', 'phone', 'email', 'address', 'areas served', 'speak now', 'lawyer now', 'fastest help', 'schedule consultation']
+deadline_keywords = ['insurance', 'uninsured', 'time limit', 'deadline']
+car_accident_terms = ['car accident', 'car accidents', 'crash']
+injury_terms = ['injury', 'injuries', 'hurt', 'wounds']
+liability_terms = ['proving liability', 'prove liability']
+
+
+def score_matrix(queries, choices, scorer, workers=1):
+    """Score every query against every choice in one vectorized call, rounded like thefuzz scores."""
+    return np.rint(rprocess.cdist(queries, choices, scorer=scorer, dtype=np.float64, workers=workers))
+
+
+class PhraseMatcher:
+    """Aho-Corasick automaton that finds every phrase contained in a text in a single pass."""
+
+    def __init__(self, phrases):
+        self.transitions = [{}]
+        self.fail = [0]
+        self.outputs = [()]
+        for phrase in phrases:
+            state = 0
+            for char in phrase:
+                if char not in self.transitions[state]:
+                    self.transitions.append({})
+                    self.fail.append(0)
+                    self.outputs.append(())
+                    self.transitions[state][char] = len(self.transitions) - 1
+                state = self.transitions[state][char]
+            if phrase not in self.outputs[state]:
+                self.outputs[state] += (phrase,)
+
+        queue = deque(self.transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, target in self.transitions[state].items():
+                queue.append(target)
+                fallback = self.fail[state]
+                while fallback and char not in self.transitions[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[target] = self.transitions[fallback].get(char, 0)
+                self.outputs[target] += self.outputs[self.fail[target]]
+
+    def find(self, text):
+        """Return the set of phrases occurring anywhere in the text."""
+        transitions, fail, outputs = self.transitions, self.fail, self.outputs
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in transitions[state]:
+                state = fail[state]
+            state = transitions[state].get(char, 0)
+            if outputs[state]:
+                found.update(outputs[state])
+        return found
+
+
+class SpellingIndex:
+    """SymSpell-style deletion index suggesting vocabulary words within a bounded edit distance."""
+
+    def __init__(self, vocabulary, corpus=(), max_edit_distance=2):
+        self.max_edit_distance = max_edit_distance
+        self.frequencies = Counter(vocabulary)
+        for word in corpus:
+            if word in self.frequencies:
+                self.frequencies[word] += 1
+        self.deletes = {}
+        for word in self.frequencies:
+            for variant in self._deletes(word):
+                self.deletes.setdefault(variant, []).append(word)
+
+    def _deletes(self, word):
+        """Return every string reachable from the word by up to max_edit_distance deletions."""
+        variants = {word}
+        frontier = {word}
+        for _ in range(self.max_edit_distance):
+            frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant))}
+            variants |= frontier
+        return variants
+
+    def suggest(self, word):
+        """Return vocabulary words within the edit distance, closest and most frequent first."""
+        if word in self.frequencies:
+            return [word]
+        candidates = set()
+        for variant in self._deletes(word):
+            candidates.update(self.deletes.get(variant, ()))
+        ranked = []
+        for candidate in candidates:
+            distance = OSA.distance(word, candidate, score_cutoff=self.max_edit_distance)
+            if distance <= self.max_edit_distance:
+                ranked.append((distance, -self.frequencies[candidate], candidate))
+        return [candidate for _, _, candidate in sorted(ranked)]
+
+
+def trigrams(text):
+    """Return the set of character trigrams in a string."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Inverted index from character trigrams to the candidates whose forms contain them.
+
+    A candidate can only score above the fuzzy cutoffs against a message it shares
+    a trigram with, unless either side consists solely of tokens shorter than three
+    characters (token-set scoring gives 100 on a shared short token), so those
+    candidates and messages bypass pruning.
+    """
+
+    def __init__(self, candidate_forms, min_shared=1):
+        self.size = len(candidate_forms)
+        self.min_shared = min_shared
+        self.postings = {}
+        self.unpruned = []
+        for position, forms in enumerate(candidate_forms):
+            if not _has_long_token(forms):
+                self.unpruned.append(position)
+                continue
+            for gram in set().union(*(trigrams(form) for form in forms)):
+                self.postings.setdefault(gram, []).append(position)
+
+    def lookup(self, forms):
+        """Return the set of candidate positions sharing enough trigrams with any of the forms, or None for all."""
+        if not _has_long_token(forms):
+            return None
+        shared = Counter()
+        for gram in set().union(*(trigrams(form) for form in forms)):
+            shared.update(self.postings.get(gram, ()))
+        found = {position for position, count in shared.items() if count >= self.min_shared}
+        found.update(self.unpruned)
+        return found
+
+    def prune(self, message_forms):
+        """Return the sorted candidate columns any message needs and a per-message candidate mask over them."""
+        lookups = [self.lookup(forms) for forms in message_forms]
+        if any(found is None for found in lookups):
+            columns = list(range(self.size))
+        else:
+            columns = sorted(set().union(*lookups))
+        candidates = np.zeros((len(message_forms), len(columns)), dtype=bool)
+        for row, found in enumerate(lookups):
+            if found is None:
+                candidates[row] = True
+            else:
+                candidates[row] = [column in found for column in columns]
+        return columns, candidates
+
+
+_ALPHABET = {char: position for position, char in enumerate('abcdefghijklmnopqrstuvwxyz0123456789 ')}
+_OTHER = len(_ALPHABET)
+
+
+def _histograms(forms):
+    """Return a (len(forms), alphabet) matrix of character counts, folding all other characters into one bucket."""
+    matrix = np.zeros((len(forms), _OTHER + 1), dtype=np.int32)
+    for row, form in enumerate(forms):
+        if form:
+            matrix[row] = np.bincount([_ALPHABET.get(char, _OTHER) for char in form], minlength=_OTHER + 1)
+    return matrix
+
+
+class ScoreBounds:
+    """Cheap upper bounds on partial and token-set ratios against a fixed candidate list.
+
+    Indel similarity is bounded by the shared character multiset, so partial_ratio can
+    be at most 200 * overlap / (len(shorter) + overlap). token_set_ratio reaches 100
+    whenever the token sets intersect; for disjoint sets it is a plain ratio of the
+    joined unique tokens and is bounded by 200 * overlap / (total length).
+    """
+
+    def __init__(self, partial_forms, token_forms):
+        self.partial_histograms = _histograms(partial_forms)
+        self.partial_lengths = np.array([len(form) for form in partial_forms])
+        joined = [' '.join(set(form.split())) for form in token_forms]
+        self.token_histograms = _histograms(joined)
+        self.token_lengths = np.array([len(form) for form in joined])
+        postings = {}
+        for position, form in enumerate(token_forms):
+            for token in set(form.split()):
+                postings.setdefault(token, []).append(position)
+        self.token_postings = {token: np.array(positions, dtype=np.intp) for token, positions in postings.items()}
+
+    def upper_bounds(self, partial_form, token_form, columns):
+        """Return (token_set, partial) upper bounds for the message forms against the given candidate columns."""
+        overlap = np.minimum(self.partial_histograms[columns], _histograms([partial_form])[0]).sum(axis=1)
+        shorter = np.minimum(self.partial_lengths[columns], len(partial_form))
+        partial = np.full(len(columns), 100.0)
+        nonempty = shorter > 0
+        partial[nonempty] = 200.0 * overlap[nonempty] / (shorter[nonempty] + overlap[nonempty])
+
+        tokens = set(token_form.split())
+        if not tokens:
+            return np.zeros(len(columns)), partial
+        joined = ' '.join(tokens)
+        overlap = np.minimum(self.token_histograms[columns], _histograms([joined])[0]).sum(axis=1)
+        token_set = 200.0 * overlap / (self.token_lengths[columns] + len(joined))
+        shared = np.zeros(len(self.token_lengths), dtype=bool)
+        for token in tokens:
+            positions = self.token_postings.get(token)
+            if positions is not None:
+                shared[positions] = True
+        token_set[shared[columns]] = 100.0
+        return token_set, partial
+
+
+def _has_long_token(forms):
+    """Return whether any of the forms contains a token of at least three characters."""
+    return any(len(token) >= 3 for form in forms for token in form.split())
+
+
+class IntentIndex:
+    """Routing tables compiled once per website map and shared by every message."""
+
+    def __init__(self, website_map):
+        self.version = next(_index_versions)
+        self.map_keys = tuple(website_map.keys())
+        self.service_titles = {normalize_message(title): title for title in self.map_keys}
+        self.service_title_list = [(normalize_message(title), title) for title in self.service_titles.values()]
+        self.synonyms = {normalize_message(phrase): target for phrase, target in synonyms.items()}
+        self.synonym_list = list(self.synonyms)
+        self.common_keywords = {normalize_message(keyword) for keyword in common_keywords}
+        self.subsection_queries = list(canonical_queries.items())
+        self.query_names = [query for query, _ in self.subsection_queries]
+        self.query_token_forms = [full_process(query, force_ascii=True) for query in self.query_names]
+        self.query_keywords = list(canonical_queries.values())
+        self.keyword_queries = {}
+        for position, (_, query_keywords) in enumerate(self.query_keywords):
+            for keyword in query_keywords:
+                self.keyword_queries.setdefault(keyword.lower(), position)
+        self.service_title_order = {}
+        for position, (lowered, _) in enumerate(self.service_title_list):
+            self.service_title_order.setdefault(lowered, position)
+        self.synonym_order = {synonym: position for position, synonym in enumerate(self.synonym_list)}
+        self.all_terms = list(self.service_titles.keys()) + self.synonym_list + [normalize_message(keyword) for keyword in common_keywords]
+        self.all_terms_set = set(self.all_terms)
+        self.term_forms = [full_process(term) for term in self.all_terms]
+        self.term_token_forms = [full_process(term, force_ascii=True) for term in self.term_forms]
+        self.query_trigrams = TrigramIndex(list(zip(self.query_names, self.query_token_forms)))
+        self.term_trigrams = TrigramIndex(list(zip(self.term_forms, self.term_token_forms)))
+        self.query_bounds = ScoreBounds(self.query_names, self.query_token_forms)
+        self.term_bounds = ScoreBounds(self.term_forms, self.term_token_forms)
+        self.term_form_positions = {}
+        self.term_substrings = {}
+        for position, form in enumerate(self.term_forms):
+            self.term_form_positions.setdefault(form, position)
+            for start in range(len(form)):
+                for end in range(start + 1, len(form) + 1):
+                    self.term_substrings.setdefault(form[start:end], position)
+        self.term_form_matcher = PhraseMatcher(self.term_form_positions)
+        self.spelling = SpellingIndex(
+            [word for form in self.term_forms for word in form.split()],
+            [word for query in self.query_token_forms for word in query.split()]
+        )
+        self.token_terms = {
+            word: [position for position, form in enumerate(self.term_forms) if word in form]
+            for word in self.spelling.frequencies
+        }
+        self.synonym_routes = {phrase: self._synonym_route(target) for phrase, target in self.synonyms.items()}
+        self.term_routes = {term: self._term_route(term) for term in self.all_terms}
+        self.phrase_matcher = PhraseMatcher(
+            list(self.keyword_queries) + list(self.service_title_order) + self.synonym_list + car_accident_terms
+            + injury_terms + liability_terms + contact_keywords + deadline_keywords + ['causes', 'what to do']
+        )
+        logging.debug(f"Compiled intent index: {len(self.service_titles)} services, {len(self.all_terms)} terms, {len(self.subsection_queries)} queries")
+
+    def _synonym_route(self, target):
+        """Resolve the keywords and intent a synonym target routes to."""
+        if target in self.service_titles:
+            return [self.service_titles[target]], "service"
+        if target in car_accident_subsections:
+            return [target, 'Car Accidents'], "subsection"
+        return ['Contact Us'], "contact"
+
+    def _term_route(self, term):
+        """Resolve a fuzzy-matched term to (keywords, intent, corrected_message, always_corrected)."""
+        if term in self.synonyms:
+            keywords, intent = self.synonym_routes[term]
+            return keywords, intent, self.synonyms[term], True
+        if term in self.service_titles:
+            return [self.service_titles[term]], "service", term, False
+        if term in contact_keywords:
+            return ['Contact Us'], "contact", 'contact us', False
+        if term in deadline_keywords:
+            return [term, 'Car Accidents'], "subsection", term, False
+        return [term], "subsection", None, False
+
+    def route_term(self, term, user_message_lower):
+        """Build the extraction result for a term picked by the fuzzy pass."""
+        keywords, intent, corrected_message, always_corrected = self.term_routes[term]
+        if corrected_message is None:
+            return list(keywords), intent, user_message_lower, False
+        was_corrected = always_corrected or user_message_lower != corrected_message
+        return list(keywords), intent, corrected_message, was_corrected
+
+    def match_subsection_queries(self, messages, workers=1, bounded=False):
+        """Return the index of the first subsection query scoring above 90 for each message, or None."""
+        if bounded:
+            return [self._first_subsection_query(message) for message in messages]
+        token_forms = [full_process(message, force_ascii=True) for message in messages]
+        columns, candidates = self.query_trigrams.prune(list(zip(messages, token_forms)))
+        if not columns:
+            return [None] * len(messages)
+        token_set = score_matrix(token_forms, [self.query_token_forms[column] for column in columns], rfuzz.token_set_ratio, workers)
+        partial = score_matrix(messages, [self.query_names[column] for column in columns], rfuzz.partial_ratio, workers)
+        passed = ((token_set > 90) | (partial > 90)) & candidates
+        first = passed.argmax(axis=1)
+        return [columns[column] if passed[row, column] else None for row, column in enumerate(first)]
+
+    def _first_subsection_query(self, message):
+        """Scan candidate queries in order, skipping any whose score bound cannot pass and stopping at the first pass."""
+        token_form = full_process(message, force_ascii=True)
+        columns = self._candidate_columns(self.query_trigrams, (message, token_form))
+        token_bounds, partial_bounds = self.query_bounds.upper_bounds(message, token_form, columns)
+        for column, token_bound, partial_bound in zip(columns, token_bounds, partial_bounds):
+            if token_bound >= 90.5 and round(rfuzz.token_set_ratio(token_form, self.query_token_forms[column], score_cutoff=90.5)) > 90:
+                return int(column)
+            if partial_bound >= 90.5 and round(rfuzz.partial_ratio(message, self.query_names[column], score_cutoff=90.5)) > 90:
+                return int(column)
+        return None
+
+    def match_terms(self, messages, score_cutoff=90, workers=1, bounded=False):
+        """Return the best (term, score) at or above the cutoff for each message, or None."""
+        if bounded:
+            return [self._best_term(message, score_cutoff) for message in messages]
+        processed = [full_process(message) for message in messages]
+        token_forms = [full_process(message, force_ascii=True) for message in processed]
+        columns, candidates = self.term_trigrams.prune(list(zip(processed, token_forms)))
+        if not columns:
+            return [None] * len(messages)
+        token_set = score_matrix(token_forms, [self.term_token_forms[column] for column in columns], rfuzz.token_set_ratio, workers)
+        partial = score_matrix(processed, [self.term_forms[column] for column in columns], rfuzz.partial_ratio, workers)
+        scores = np.where(candidates, np.maximum(token_set, partial), 0)
+        best = scores.argmax(axis=1)
+        return [
+            (self.all_terms[columns[column]], int(scores[row, column])) if scores[row, column] >= score_cutoff else None
+            for row, column in enumerate(best)
+        ]
+
+    def _best_term(self, message, score_cutoff=90):
+        """Find the first highest-scoring term, skipping candidates whose bound cannot beat the current best."""
+        processed = full_process(message)
+        token_form = full_process(processed, force_ascii=True)
+        columns = self._candidate_columns(self.term_trigrams, (processed, token_form))
+        token_bounds, partial_bounds = self.term_bounds.upper_bounds(processed, token_form, columns)
+        best = None
+        best_score = score_cutoff - 1
+        for column, bound in zip(columns, np.maximum(token_bounds, partial_bounds)):
+            cutoff = best_score + 0.5
+            if bound < cutoff:
+                continue
+            score = max(
+                round(rfuzz.token_set_ratio(token_form, self.term_token_forms[column], score_cutoff=cutoff)),
+                round(rfuzz.partial_ratio(processed, self.term_forms[column], score_cutoff=cutoff))
+            )
+            if score > best_score:
+                best, best_score = column, score
+                if score == 100:
+                    break
+        return (self.all_terms[best], int(best_score)) if best is not None else None
+
+    @staticmethod
+    def _candidate_columns(trigram_index, forms):
+        """Return the trigram-pruned candidate positions for one message, in table order."""
+        found = trigram_index.lookup(forms)
+        if found is None:
+            return np.arange(trigram_index.size)
+        return np.array(sorted(found), dtype=np.intp)
+
+    def correct_word(self, word):
+        """Return the (term, score) a word should be corrected to, or None if no term scores above 90."""
+        processed = full_process(word)
+        if not processed:
+            return None
+        positions = [self.term_form_positions[form] for form in self.term_form_matcher.find(processed)]
+        if processed in self.term_substrings:
+            positions.append(self.term_substrings[processed])
+        if positions:
+            return self.all_terms[min(positions)], 100
+        best = None
+        for rank, suggestion in enumerate(self.spelling.suggest(processed)):
+            for position in self.token_terms[suggestion]:
+                score = int(round(rfuzz.partial_ratio(processed, self.term_forms[position])))
+                if score > 90 and (best is None or (-score, rank, position) < best):
+                    best = (-score, rank, position)
+        if best:
+            return self.all_terms[best[2]], -best[0]
+        return None
+
+
+class EmbeddingIntentClassifier:
+    """Nearest canonical question by cosine similarity of precomputed sentence embeddings."""
+
+    def __init__(self, embeddings, threshold=0.75):
+        self.version = next(_index_versions)
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.questions = list(canonical_queries)
+        self.matrix = self._normalize(embeddings.embed_documents(self.questions))
+        logging.debug(f"Embedded {len(self.questions)} canonical questions for intent classification")
+
+    @staticmethod
+    def _normalize(vectors):
+        """Return the vectors as a float32 matrix of unit-length rows."""
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    def classify(self, messages):
+        """Return the (question, similarity) above the threshold for each message, or None."""
+        if not messages:
+            return []
+        similarities = self._normalize(self.embeddings.embed_documents(messages)) @ self.matrix.T
+        best = similarities.argmax(axis=1)
+        return [
+            (self.questions[column], float(similarities[row, column])) if similarities[row, column] >= self.threshold else None
+            for row, column in enumerate(best)
+        ]
+
+
+def char_ngrams(text, min_n=2, max_n=4):
+    """Return the character n-grams of each space-padded word, the features of the learned classifier."""
+    grams = []
+    for word in text.split():
+        padded = f" {word} "
+        for n in range(min_n, max_n + 1):
+            grams.extend(padded[start:start + n] for start in range(len(padded) - n + 1))
+    return grams
+
+
+class LearnedIntentClassifier:
+    """Linear model over character n-gram TF-IDF features, trained offline by train_intent_classifier.py."""
+
+    def __init__(self, vocabulary, idf, weights, bias, labels, temperature=1.0, cutoff=1.0, ngram_range=(2, 4)):
+        self.version = next(_index_versions)
+        self.vocabulary = list(vocabulary)
+        self.positions = {gram: position for position, gram in enumerate(self.vocabulary)}
+        self.idf = np.asarray(idf, dtype=np.float32)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.labels = [(list(keywords), intent, corrected_message) for keywords, intent, corrected_message in labels]
+        self.temperature = float(temperature)
+        self.cutoff = float(cutoff)
+        self.ngram_range = tuple(int(n) for n in ngram_range)
+        self.word_columns = LRUCache(maxsize=65536)
+
+    def _columns(self, word):
+        """Return the vocabulary positions of one word's n-grams, memoized since words recur across messages."""
+        columns = self.word_columns.get(word)
+        if columns is None:
+            positions = self.positions
+            columns = [positions[gram] for gram in char_ngrams(word, *self.ngram_range) if gram in positions]
+            self.word_columns.put(word, columns)
+        return columns
+
+    def features(self, message):
+        """Return the vocabulary positions and L2-normalized sublinear TF-IDF values of a message."""
+        columns, counts = np.unique(np.fromiter(
+            (column for word in message.split() for column in self._columns(word)), dtype=np.int64
+        ), return_counts=True)
+        values = (1 + np.log(counts.astype(np.float32))) * self.idf[columns]
+        norm = np.linalg.norm(values)
+        return columns, values / norm if norm else values
+
+    def probabilities(self, message):
+        """Return the temperature-scaled class probabilities of a message."""
+        columns, values = self.features(message)
+        logits = (self.bias + values @ self.weights[columns]) / self.temperature
+        exp = np.exp(logits - logits.max())
+        return exp / exp.sum()
+
+    def classify(self, messages):
+        """Return the (keywords, intent, corrected message, confidence) of each message the model is sure of, or None."""
+        results = []
+        for message in messages:
+            probabilities = self.probabilities(message)
+            best = int(probabilities.argmax())
+            keywords, intent, corrected_message = self.labels[best]
+            confidence = float(probabilities[best])
+            results.append((list(keywords), intent, corrected_message, confidence) if intent and confidence >= self.cutoff else None)
+        return results
+
+    def save(self, path):
+        """Write the model as plain NumPy arrays."""
+        np.savez(
+            path,
+            vocabulary=np.array(self.vocabulary, dtype=str),
+            idf=self.idf,
+            weights=self.weights,
+            bias=self.bias,
+            label_keywords=np.array([json.dumps(keywords) for keywords, _, _ in self.labels], dtype=str),
+            label_intents=np.array([intent for _, intent, _ in self.labels], dtype=str),
+            label_messages=np.array([corrected_message for _, _, corrected_message in self.labels], dtype=str),
+            temperature=np.float32(self.temperature),
+            cutoff=np.float32(self.cutoff),
+            ngram_range=np.array(self.ngram_range, dtype=np.int64)
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Read a model written by save."""
+        with np.load(path, allow_pickle=False) as data:
+            labels = zip(
+                (json.loads(keywords) for keywords in data['label_keywords']),
+                (str(intent) for intent in data['label_intents']),
+                (str(corrected_message) for corrected_message in data['label_messages'])
+            )
+            return cls(
+                [str(gram) for gram in data['vocabulary']], data['idf'], data['weights'], data['bias'], list(labels),
+                float(data['temperature']), float(data['cutoff']), tuple(data['ngram_range'])
+            )
+
+
+_intent_index = None
+_intent_classifier = None
+_learned_classifier = None
+_index_versions = itertools.count(1)
+_index_flight = SingleFlight()
+intent_cache = LRUCache(maxsize=int(os.environ.get('INTENT_CACHE_SIZE', 1024)))
+
+
+def get_intent_index(website_map):
+    """Return the compiled intent index, rebuilding it only when the website map changes."""
+    index = _intent_index
+    if index is None or index.map_keys != tuple(website_map.keys()):
+        index = _index_flight.do(tuple(website_map.keys()), _compile_intent_index, website_map)
+    return index
+
+
+def _compile_intent_index(website_map):
+    """Compile and install the intent index for a website map; concurrent callers share one compilation."""
+    global _intent_index
+    index = _intent_index
+    if index is None or index.map_keys != tuple(website_map.keys()):
+        index = IntentIndex(website_map)
+        _intent_index = index
+        intent_cache.clear()
+    return index
+
+
+def set_intent_embeddings(embeddings, threshold=0.75):
+    """Enable the embedding stage for messages the matching stages would route to the general fallback."""
+    global _intent_classifier
+    _intent_classifier = EmbeddingIntentClassifier(embeddings, threshold) if embeddings is not None else None
+    intent_cache.clear()
+
+
+def load_intent_model(path):
+    """Enable the learned classifier stage from a model file, or disable it when path is None."""
+    global _learned_classifier
+    _learned_classifier = LearnedIntentClassifier.load(path) if path else None
+    if _learned_classifier is not None:
+        logging.debug(f"Loaded learned intent classifier from {path}: {len(_learned_classifier.labels)} labels, cutoff {_learned_classifier.cutoff:.3f}")
+    intent_cache.clear()
+
+
+def configure_intent_cache(maxsize):
+    """Replace the intent result cache with an empty one holding up to maxsize messages."""
+    global intent_cache
+    intent_cache = LRUCache(maxsize=maxsize)
+
+
+def get_intent_cache_stats():
+    """Return hit/miss counters for the intent result cache."""
+    return intent_cache.stats()
+
+
 def extract_keywords_and_intent(user_message, session_id, website_map, user_sessions):
     """Extract keywords and intent from user message with precise service matching."""
-    logging.debug(f"Extracting keywords and intent from message: {user_message}")
+    return extract_keywords_and_intent_batch([user_message], session_id, website_map, user_sessions)[0]
 
-    user_message_lower = user_message.lower().strip()
-    keywords = []
-    intent = None
-    corrected_message = user_message_lower
-    was_corrected = False
-
-    service_titles = {title.lower(): title for title in website_map.keys()}
-    
-    synonyms = {
-        'slip fall': 'slip trip fall',
-        'slip and fall': 'slip trip fall',
-        'dog bite': 'dog bites & attacks',
-        'dog attack': 'dog bites & attacks',
-        'product defect': 'product liability',
-        'medical error': 'medical malpractice',
-        'med mal': 'medical malpractice',
-        'contact': 'contact us',
-        'phone': 'contact us',
-        'email': 'contact us',
-        'address': 'contact us',
-        'crash': 'car accidents',
-        'car crash': 'car accidents',
-        'auto accident': 'car accidents',
-        'attorney': 'contact us',
-        'lawyer': 'contact us',
-        'consultation': 'contact us',
-        'free consultation': 'fees and costs',
-        'contingency fee': 'fees and costs',
-        'case worth': 'legal process',
-        'case value': 'legal process',
-        'case duration': 'legal process',
-        'court case': 'legal process',
-        'filing claim': 'legal process',
-        'lost wages': 'medical and injury',
-        'personal injury': 'medical and injury',
-        'injury claim': 'medical and injury',
-        'doctor visit': 'medical and injury',
-        'case review': 'case evaluation',
-        'strong claim': 'case evaluation',
-        'claim documents': 'case evaluation',
-        'workplace injury': 'specific case types',
-        'motorcycle accident': 'specific case types',
-        'areas served': 'availability and location',
-        'speak now': 'availability and location',
-        'lawyer now': 'immediate help',
-        'fastest help': 'immediate help',
-        'schedule consultation': 'immediate help',
-        'causes': 'causes',
-        'reasons': 'causes',
-        'why accidents': 'causes',
-        'what to do': 'what to do',
-        'steps after': 'what to do',
-        'post-accident': 'what to do',
-        'after accident': 'what to do',
-        'injury': 'injuries',
-        'injuries': 'injuries',
-        'hurt': 'injuries',
-        'wounds': 'injuries',
-        'insurance': 'uninsured driver',
-        'uninsured': 'uninsured driver',
-        'time limit': 'claim deadline',
-        'deadline': 'claim deadline'
-    }
-
-    common_keywords = [
-        'causes', 'cause', 'crash', 'proving liability', 'contact info', 'phone', 'email', 'address', 
-        'yes', 'no', 'what to do', 'uninsured driver', 'claim deadline', 'partial fault', 
-        'lost wages', 'qualifying injuries', 'doctor visit', 'need lawyer', 'case value', 
-        'case duration', 'filing process', 'court', 'cost', 'free consultation', 'contingency', 
-        'losing case', 'review', 'strong claim', 'documents', 'slip and fall', 
-        'workplace injury', 'motorcycle accidents', 'dog bite', 'areas served', 
-        'speak now', 'lawyer now', 'fastest help', 'schedule consultation', 'injuries',
-        'insurance', 'uninsured', 'time limit', 'deadline'
-    ]
-
-    subsection_queries = {
-        'causes of car accidents': ('subsection', ['causes', 'Car Accidents']),
-        'what are the causes of car accidents': ('subsection', ['causes', 'Car Accidents']),
-        'reasons for car accidents': ('subsection', ['causes', 'Car Accidents']),
-        'why do car accidents happen': ('subsection', ['causes', 'Car Accidents']),
-        'what to do after a car accident': ('subsection', ['what to do', 'Car Accidents']),
-        'steps after a car accident': ('subsection', ['what to do', 'Car Accidents']),
-        'what should i do after a car crash': ('subsection', ['what to do', 'Car Accidents']),
-        'post-accident steps': ('subsection', ['what to do', 'Car Accidents']),
-        'car accident injuries': ('subsection', ['injuries', 'Car Accidents']),
-        'car accident injury': ('subsection', ['injuries', 'Car Accidents']),
-        'injuries from car accidents': ('subsection', ['injuries', 'Car Accidents']),
-        'what injuries from car accidents': ('subsection', ['injuries', 'Car Accidents']),
-        'do i have a case if the other driver doesn’t have insurance': ('subsection', ['uninsured driver', 'Car Accidents']),
-        'how long do i have to file a claim after a car accident': ('subsection', ['claim deadline', 'Car Accidents']),
-        'can i still file a claim if i was partially at fault': ('subsection', ['partial fault', 'Car Accidents']),
-        'i’m hurt and can’t work. can i get compensation for lost wages': ('subsection', ['lost wages', 'Medical and Injury']),
-        'what kind of injuries qualify for a personal injury claim': ('subsection', ['qualifying injuries', 'Medical and Injury']),
-        'do i need to see a doctor before contacting a lawyer': ('subsection', ['doctor visit', 'Medical and Injury']),
-        'do i need a lawyer for a personal injury claim': ('subsection', ['need lawyer', 'Legal Process']),
-        'how much is my case worth': ('subsection', ['case value', 'Legal Process']),
-        'how long will my case take': ('subsection', ['case duration', 'Legal Process']),
-        'what’s the process for filing a claim': ('subsection', ['filing process', 'Legal Process']),
-        'will i have to go to court': ('subsection', ['court', 'Legal Process']),
-        'how much does it cost to hire your firm': ('subsection', ['cost', 'Fees and Costs']),
-        'do you offer free consultations': ('subsection', ['free consultation', 'Fees and Costs']),
-        'do you work on a contingency fee basis': ('subsection', ['contingency', 'Fees and Costs']),
-        'what happens if i lose my case': ('subsection', ['losing case', 'Fees and Costs']),
-        'can someone review my case': ('subsection', ['review', 'Case Evaluation']),
-        'how do i know if i have a strong claim': ('subsection', ['strong claim', 'Case Evaluation']),
-        'what documents do i need to provide': ('subsection', ['documents', 'Case Evaluation']),
-        'do you handle slip and fall injuries': ('subsection', ['slip and fall', 'Specific Case Types']),
-        'can i sue for a workplace injury': ('subsection', ['workplace injury', 'Specific Case Types']),
-        'do you take motorcycle accident cases': ('subsection', ['motorcycle accidents', 'Specific Case Types']),
-        'can i file a claim for a dog bite': ('subsection', ['dog bite', 'Specific Case Types']),
-        'are you available in [city/state]': ('contact', ['Contact Us']),
-        'what areas do you serve': ('contact', ['Contact Us']),
-        'can i speak with someone now': ('contact', ['Contact Us']),
-        'can i talk to a lawyer right now': ('contact', ['Contact Us']),
-        'what’s the fastest way to get help': ('contact', ['Contact Us']),
-        'how do i schedule a consultation': ('contact', ['Contact Us']),
-        'do i have a case if the other driver doesn’t have insurance': ('subsection', ['uninsured driver', 'Car Accidents']),
-        'how long do i have to file a claim': ('subsection', ['claim deadline', 'Car Accidents'])
-    }
-
-    if user_message_lower in service_titles:
-        logging.debug(f"Exact match for service: {user_message_lower}")
-        intent = 'service'
-        keywords = [service_titles[user_message_lower]]
-        return keywords, intent, corrected_message, was_corrected
-
-    for query, (query_intent, query_keywords) in subsection_queries.items():
-        if fuzz.token_set_ratio(user_message_lower, query) > 90 or fuzz.partial_ratio(user_message_lower, query) > 90:
-            logging.debug(f"Exact match for subsection query: {query}")
-            return query_keywords, query_intent, query, user_message_lower != query
 
-    if user_message_lower in synonyms:
-        corrected_message = synonyms[user_message_lower]
-        was_corrected = True
-        if corrected_message in service_titles:
-            intent = "service"
-            keywords = [service_titles[corrected_message]]
-        elif corrected_message in ['causes', 'what to do', 'injuries', 'uninsured driver', 'claim deadline']:
-            intent = "subsection"
-            keywords = [corrected_message, 'Car Accidents']
+def extract_keywords_and_intent_batch(user_messages, session_id, website_map, user_sessions, workers=1, bounded=None):
+    """Extract keywords and intent for many messages, scoring each fuzzy stage in one vectorized call.
+
+    With bounded matching each message scans its candidates in order, skipping those whose
+    score bound cannot pass and stopping at the first certain winner. It defaults to on for
+    a single message and off (one score matrix per stage) for larger batches.
+    """
+    if bounded is None:
+        bounded = len(user_messages) == 1
+    index = get_intent_index(website_map)
+    classifier = _intent_classifier
+    learned = _learned_classifier
+    version = (index.version, classifier.version if classifier else 0, learned.version if learned else 0)
+    cache = intent_cache
+    results = [None] * len(user_messages)
+    misses = {}
+    for i, user_message in enumerate(user_messages):
+        logging.debug(f"Extracting keywords and intent from message: {user_message}")
+        user_message_lower = normalize_message(user_message)
+        cached = cache.get((version, user_message_lower))
+        if cached is not None:
+            logging.debug(f"Intent cache hit for message: {user_message_lower}")
+            results[i] = _copy_result(cached)
         else:
-            intent = "contact"
-            keywords = ['Contact Us']
-        logging.debug(f"Synonym match: '{user_message_lower}' → '{corrected_message}'")
-        return keywords, intent, corrected_message, was_corrected
-
-    all_terms = list(service_titles.keys()) + list(synonyms.keys()) + common_keywords
-    best_matches = process.extractBests(
-        user_message_lower,
-        all_terms,
-        scorer=lambda x, y: max(fuzz.token_set_ratio(x, y), fuzz.partial_ratio(x, y)),
-        score_cutoff=90,
-        limit=1
-    )
-
-    if best_matches:
-        best_match, score = best_matches[0]
-        if best_match in synonyms:
-            corrected_message = synonyms[best_match]
-            was_corrected = True
-            if corrected_message in service_titles:
-                intent = "service"
-                keywords = [service_titles[corrected_message]]
-            elif corrected_message in ['causes', 'what to do', 'injuries', 'uninsured driver', 'claim deadline']:
-                intent = "subsection"
-                keywords = [corrected_message, 'Car Accidents']
-            else:
-                intent = "contact"
-                keywords = ['Contact Us']
-        elif best_match in service_titles:
-            logging.debug(f"Fuzzy match: '{user_message_lower}' → '{best_match}' (score: {score})")
-            corrected_message = best_match
-            was_corrected = user_message_lower != best_match
-            keywords = [service_titles[best_match]]
-            intent = "service"
-        elif best_match in ['contact info', 'phone', 'email', 'address', 'areas served', 'speak now', 'lawyer now', 'fastest help', 'schedule consultation', 'insurance', 'uninsured', 'time limit', 'deadline']:
-            intent = "contact" if best_match in ['contact info', 'phone', 'email', 'address', 'areas served', 'speak now', 'lawyer now', 'fastest help', 'schedule consultation'] else "subsection"
-            keywords = ['Contact Us'] if intent == "contact" else [best_match, 'Car Accidents']
-            corrected_message = 'contact us' if intent == "contact" else best_match
-            was_corrected = user_message_lower != corrected_message
+            misses.setdefault(user_message_lower, []).append(i)
+
+    if misses:
+        messages = list(misses)
+        for user_message_lower, result in zip(messages, _classify_batch(index, messages, workers, classifier, bounded, learned)):
+            cache.put((version, user_message_lower), result)
+            for i in misses[user_message_lower]:
+                results[i] = _copy_result(result)
+    return results
+
+
+def _copy_result(result):
+    """Return a copy of an extraction result whose keyword list callers may safely mutate."""
+    keywords, intent, corrected_message, was_corrected = result
+    return list(keywords), intent, corrected_message, was_corrected
+
+
+def _classify_batch(index, messages, workers=1, classifier=None, bounded=False, learned=None):
+    """Run the matching stages over lowercased messages, each stage scoring all pending messages at once."""
+    service_titles = index.service_titles
+    results = [None] * len(messages)
+
+    pending = []
+    for i, user_message_lower in enumerate(messages):
+        if user_message_lower in service_titles:
+            logging.debug(f"Exact match for service: {user_message_lower}")
+            results[i] = [service_titles[user_message_lower]], 'service', user_message_lower, False
         else:
-            intent = "subsection"
-            keywords = [best_match]
-        return keywords, intent, corrected_message, was_corrected
-
-    corrected_words = []
-    for word in user_message_lower.split():
-        if len(word) > 3:
-            best_match, score = process.extractOne(word, all_terms, scorer=fuzz.partial_ratio)
-            if score > 90 and best_match != word and word not in all_terms:
-                corrected_words.append(best_match)
-                was_corrected = True
-                logging.debug(f"Corrected '{word}' to '{best_match}' (score: {score})")
-            else:
-                corrected_words.append(word)
+            pending.append(i)
+
+    if learned is not None and pending:
+        # Messages that are exact routing-table keys (synonyms, terms, canonical questions) keep their rule routes
+        exact = [i for i in pending if messages[i] in index.all_terms_set or messages[i] in canonical_queries]
+        learnable = [i for i in pending if messages[i] not in index.all_terms_set and messages[i] not in canonical_queries]
+        matches = learned.classify([messages[i] for i in learnable]) if learnable else []
+        unmatched = exact
+        for i, match in zip(learnable, matches):
+            if match is None:
+                unmatched.append(i)
+                continue
+            keywords, intent, corrected_message, confidence = match
+            logging.debug(f"Learned match: '{messages[i]}' → '{corrected_message}' (confidence: {confidence:.3f})")
+            results[i] = keywords, intent, corrected_message, messages[i] != corrected_message
+        pending = unmatched
+
+    if pending:
+        matches = index.match_subsection_queries([messages[i] for i in pending], workers, bounded)
+        unmatched = []
+        for i, match in zip(pending, matches):
+            if match is None:
+                unmatched.append(i)
+                continue
+            query, (query_intent, query_keywords) = index.subsection_queries[match]
+            logging.debug(f"Exact match for subsection query: {query}")
+            results[i] = list(query_keywords), query_intent, query, messages[i] != query
+        pending = unmatched
+
+    unmatched = []
+    for i in pending:
+        user_message_lower = messages[i]
+        if user_message_lower in index.synonym_routes:
+            keywords, intent = index.synonym_routes[user_message_lower]
+            corrected_message = index.synonyms[user_message_lower]
+            logging.debug(f"Synonym match: '{user_message_lower}' → '{corrected_message}'")
+            results[i] = list(keywords), intent, corrected_message, True
         else:
-            corrected_words.append(word)
-    corrected_message = ' '.join(corrected_words)
-
-    for query, (query_intent, query_keywords) in subsection_queries.items():
-        if any(keyword.lower() in corrected_message for keyword in query_keywords):
-            intent = query_intent
-            keywords = query_keywords
-            break
+            unmatched.append(i)
+    pending = unmatched
+
+    if pending:
+        matches = index.match_terms([messages[i] for i in pending], workers=workers, bounded=bounded)
+        unmatched = []
+        for i, match in zip(pending, matches):
+            if match is None:
+                unmatched.append(i)
+                continue
+            best_match, score = match
+            logging.debug(f"Fuzzy match: '{messages[i]}' → '{best_match}' (score: {score})")
+            results[i] = index.route_term(best_match, messages[i])
+        pending = unmatched
+
+    if pending:
+        for i in pending:
+            corrected_words = []
+            was_corrected = False
+            for word in messages[i].split():
+                if len(word) > 3 and word not in index.all_terms_set:
+                    match = index.correct_word(word)
+                    if match and match[0] != word:
+                        best_match, score = match
+                        corrected_words.append(best_match)
+                        was_corrected = True
+                        logging.debug(f"Corrected '{word}' to '{best_match}' (score: {score})")
+                        continue
+                corrected_words.append(word)
+            results[i] = _resolve_fallback(index, messages[i], ' '.join(corrected_words), was_corrected)
+
+    general = [i for i in pending if results[i][1] == "general"]
+    if classifier is not None and general:
+        try:
+            matches = classifier.classify([messages[i] for i in general])
+        except Exception as e:
+            logging.error(f"Error classifying messages by embedding: {str(e)}")
+            matches = [None] * len(general)
+        for i, match in zip(general, matches):
+            if match is None:
+                continue
+            query, similarity = match
+            query_intent, query_keywords = canonical_queries[query]
+            logging.debug(f"Embedding match: '{messages[i]}' → '{query}' (similarity: {similarity:.3f})")
+            results[i] = list(query_keywords), query_intent, query, messages[i] != query
+
+    return results
+
+
+def _resolve_fallback(index, user_message_lower, corrected_message, was_corrected):
+    """Resolve intent by keyword containment once the fuzzy stages found nothing."""
+    service_titles = index.service_titles
+    keywords = []
+    intent = None
+    found = index.phrase_matcher.find(corrected_message)
+
+    query_hits = [index.keyword_queries[phrase] for phrase in found if phrase in index.keyword_queries]
+    if query_hits:
+        intent, query_keywords = index.query_keywords[min(query_hits)]
+        keywords = list(query_keywords)
     else:
-        if 'causes' in corrected_message and any(s in corrected_message for s in ['car accident', 'car accidents', 'crash']):
+        mentions_car_accident = not found.isdisjoint(car_accident_terms)
+        service_hits = [index.service_title_order[phrase] for phrase in found if phrase in index.service_title_order]
+        synonym_hits = [index.synonym_order[phrase] for phrase in found if phrase in index.synonym_order]
+        if 'causes' in found and mentions_car_accident:
             intent = "subsection"
             keywords = ['causes', 'Car Accidents']
             corrected_message = 'causes of car accidents'
             was_corrected = user_message_lower != corrected_message
-        elif 'what to do' in corrected_message and any(s in corrected_message for s in ['car accident', 'car accidents', 'crash']):
+        elif 'what to do' in found and mentions_car_accident:
             intent = "subsection"
             keywords = ['what to do', 'Car Accidents']
             corrected_message = 'what to do after a car accident'
             was_corrected = user_message_lower != corrected_message
-        elif any(s in corrected_message for s in ['injury', 'injuries', 'hurt', 'wounds']) and any(s in corrected_message for s in ['car accident', 'car accidents', 'crash']):
+        elif not found.isdisjoint(injury_terms) and mentions_car_accident:
             intent = "subsection"
             keywords = ['injuries', 'Car Accidents']
             corrected_message = 'car accident injuries'
             was_corrected = user_message_lower != corrected_message
-        elif any(title.lower() in corrected_message for title in service_titles.values()):
+        elif service_hits:
             intent = "service"
-            matched_title = next(title for title in service_titles.values() if title.lower() in corrected_message)
-            keywords = [matched_title]
-        elif any(synonym in corrected_message for synonym in synonyms):
+            keywords = [index.service_title_list[min(service_hits)][1]]
+        elif synonym_hits:
             intent = "service"
-            matched_synonym = next(synonym for synonym in synonyms if synonym in corrected_message)
-            keywords = [service_titles.get(synonyms[matched_synonym], synonyms[matched_synonym].capitalize())]
-        elif 'proving liability' in corrected_message or 'prove liability' in corrected_message:
+            matched_synonym = index.synonym_list[min(synonym_hits)]
+            keywords = [service_titles.get(index.synonyms[matched_synonym], index.synonyms[matched_synonym].capitalize())]
+        elif not found.isdisjoint(liability_terms):
             intent = "subsection"
             keywords = ['proving liability']
-        elif any(keyword in corrected_message for keyword in ['contact info', 'phone', 'email', 'address', 'areas served', 'speak now', 'lawyer now', 'fastest help', 'schedule consultation']):
+        elif not found.isdisjoint(contact_keywords):
             intent = "contact"
             keywords = ['Contact Us']
-        elif any(keyword in corrected_message for keyword in ['insurance', 'uninsured', 'time limit', 'deadline']):
+        elif not found.isdisjoint(deadline_keywords):
             intent = "subsection"
-            keywords = ['uninsured driver' if 'insurance' in corrected_message or 'uninsured' in corrected_message else 'claim deadline', 'Car Accidents']
+            keywords = ['uninsured driver' if 'insurance' in found or 'uninsured' in found else 'claim deadline', 'Car Accidents']
         elif corrected_message in ['yes', 'no']:
             intent = "feedback"
         else:
             intent = "general"
-            keywords = [word for word in corrected_message.split() if word in service_titles or word in common_keywords or len(word) > 3]
+            keywords = [word for word in corrected_message.split() if word in service_titles or word in index.common_keywords or len(word) > 3]
 
     logging.debug(f"Final: Keywords={keywords}, Intent={intent}, Corrected={corrected_message}, Was_corrected={was_corrected}")
-    return keywords, intent, corrected_message, was_corrected
\ No newline at end of file
+    return keywords, intent, corrected_message, was_corrected
+
+
+_intent_model_path = os.environ.get('INTENT_MODEL_PATH', 'intent_model.npz')
+if os.path.exists(_intent_model_path):
+    try:
+        load_intent_model(_intent_model_path)
+    except Exception as e:
+        logging.error(f"Error loading intent model from {_intent_model_path}: {str(e)}")
@@ -1,4 +1,5 @@
-from database import clear_database
+from database import clear_database, init_db
 
 if __name__ == "__main__":
+    init_db()  # adds the version tables to databases created before they existed
     clear_database()
\ No newline at end of file
@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class SessionMemoryStore:
+    """Per-session conversation history bounded by turns and characters, with sliding TTL and LRU eviction across sessions."""
+
+    def __init__(self, max_turns=6, max_session_chars=4000, ttl=1800, max_sessions=1000, max_total_chars=2000000):
+        self.max_turns = max_turns
+        self.max_session_chars = max_session_chars
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_total_chars = max_total_chars
+        self.total_chars = 0
+        self.evictions = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live(self, session_id):
+        """Return the unexpired session entry, dropping it if its TTL has passed."""
+        entry = self._sessions.get(session_id)
+        if entry is not None and self.ttl and entry['expires_at'] <= time.monotonic():
+            self._drop(session_id)
+            return None
+        return entry
+
+    def _drop(self, session_id):
+        """Remove a session and release its characters from the total."""
+        entry = self._sessions.pop(session_id)
+        self.total_chars -= entry['chars']
+
+    def get_history(self, session_id):
+        """Return the session's (question, answer) turns, oldest first, as a new list."""
+        with self._lock:
+            entry = self._live(session_id)
+            if entry is None:
+                return []
+            if self.ttl:
+                entry['expires_at'] = time.monotonic() + self.ttl
+            self._sessions.move_to_end(session_id)
+            return list(entry['turns'])
+
+    def add_turn(self, session_id, question, answer):
+        """Append a turn, trimming the oldest turns of this session and the least recently used sessions to fit the limits."""
+        question = question[:self.max_session_chars]
+        answer = answer[:max(0, self.max_session_chars - len(question))]
+        with self._lock:
+            entry = self._live(session_id)
+            if entry is None:
+                entry = self._sessions[session_id] = {'turns': [], 'chars': 0, 'expires_at': 0.0}
+            entry['turns'].append((question, answer))
+            entry['chars'] += len(question) + len(answer)
+            self.total_chars += len(question) + len(answer)
+            while len(entry['turns']) > self.max_turns or entry['chars'] > self.max_session_chars:
+                old_question, old_answer = entry['turns'].pop(0)
+                entry['chars'] -= len(old_question) + len(old_answer)
+                self.total_chars -= len(old_question) + len(old_answer)
+            entry['expires_at'] = time.monotonic() + self.ttl if self.ttl else float('inf')
+            self._sessions.move_to_end(session_id)
+            now = time.monotonic()
+            while self._sessions:
+                oldest = next(iter(self._sessions))
+                if self._sessions[oldest]['expires_at'] <= now:
+                    self._drop(oldest)
+                elif len(self._sessions) > self.max_sessions or self.total_chars > self.max_total_chars:
+                    self._drop(oldest)
+                    self.evictions += 1
+                else:
+                    break
+
+    def clear(self, session_id):
+        """Forget one session's history."""
+        with self._lock:
+            if session_id in self._sessions:
+                self._drop(session_id)
+
+    def stats(self):
+        """Return session count and size counters as a plain dict."""
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'total_chars': self.total_chars,
+                'max_total_chars': self.max_total_chars,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,58 @@
+import threading
+from langchain_huggingface import HuggingFacePipeline
+from inference import BatchedPipeline
+
+
+class RecordingPipeline:
+    """Stand-in text2text pipeline that records each call's prompts and keyword arguments."""
+
+    task = 'text2text-generation'
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, prompts, **kwargs):
+        self.calls.append((list(prompts), kwargs))
+        return [[{'generated_text': f"answer to {prompt}"}] for prompt in prompts]
+
+
+def batched_llm(max_wait=0.5):
+    """Build the LLM the way build_conversational_chain does, around a recording pipeline."""
+    pipe = RecordingPipeline()
+    llm = HuggingFacePipeline(pipeline=pipe, pipeline_kwargs={'max_length': 1000})
+    llm.pipeline = BatchedPipeline(llm.pipeline, max_batch=4, max_wait=max_wait)
+    return llm, pipe
+
+
+def test_concurrent_invokes_with_pipeline_kwargs_share_one_batch():
+    llm, pipe = batched_llm()
+    answers = {}
+
+    def ask(question):
+        answers[question] = llm.invoke(question, pipeline_kwargs={'max_length': 1000})
+
+    threads = [threading.Thread(target=ask, args=(f"question {i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert answers == {f"question {i}": f"answer to question {i}" for i in range(4)}
+    assert llm.pipeline.batcher.stats()['batches'] == 1
+    assert len(pipe.calls) == 1
+    prompts, kwargs = pipe.calls[0]
+    assert sorted(prompts) == [f"question {i}" for i in range(4)]
+    assert kwargs == {'batch_size': 4, 'max_length': 1000}
+
+
+def test_calls_with_different_kwargs_are_generated_separately():
+    llm, pipe = batched_llm()
+    threads = [threading.Thread(target=llm.invoke, args=(f"question {i}",), kwargs={'pipeline_kwargs': {'max_length': 100 * (i % 2 + 1)}})
+               for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert llm.pipeline.batcher.stats()['batches'] == 1
+    assert sorted((kwargs['max_length'], len(prompts)) for prompts, kwargs in pipe.calls) == [(100, 2), (200, 2)]
@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+import pytest
+import nlp
+from nlp import canonical_queries, extract_keywords_and_intent_batch, get_intent_index, load_intent_model
+from scraper import default_website_map
+
+
+@pytest.fixture(scope='module')
+def intent_model(tmp_path_factory):
+    """Train a small learned classifier with train_intent_classifier.py and return its path."""
+    path = str(tmp_path_factory.mktemp('intent') / 'intent_model.npz')
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'train_intent_classifier.py')
+    # A lax precision target keeps the cutoff low enough for this small model to route messages
+    subprocess.run([sys.executable, script, '--output', path, '--variants', '4', '--validation-variants', '4', '--mixtures', '500', '--precision', '0.9'],
+                   check=True, capture_output=True)
+    yield path
+    load_intent_model(None)
+
+
+def test_exact_keys_route_as_the_rules_do_with_the_model_loaded(intent_model):
+    website_map = default_website_map()
+    index = get_intent_index(website_map)
+    keys = sorted(index.all_terms_set | set(canonical_queries))
+    load_intent_model(None)
+    rules = extract_keywords_and_intent_batch(keys, 'test', website_map, {})
+    load_intent_model(intent_model)
+    learned = extract_keywords_and_intent_batch(keys, 'test', website_map, {})
+    assert {key: result for key, result in zip(keys, learned)} == {key: result for key, result in zip(keys, rules)}
+
+
+def test_learned_stage_still_routes_other_messages(intent_model):
+    website_map = default_website_map()
+    load_intent_model(intent_model)
+    messages = [f"{question} please" for question in canonical_queries]
+    learned = nlp._learned_classifier.classify(messages)
+    confident = [(message, match) for message, match in zip(messages, learned) if match is not None]
+    assert confident
+    results = extract_keywords_and_intent_batch([message for message, _ in confident], 'test', website_map, {})
+    for (message, (keywords, intent, corrected_message, _)), result in zip(confident, results):
+        assert result == (keywords, intent, corrected_message, message != corrected_message)
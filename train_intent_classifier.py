@@ -0,0 +1,252 @@
+import argparse
+import logging
+import random
+import re
+from collections import Counter
+import numpy as np
+from benchmark_intent import add_typos
+from nlp import (
+    LearnedIntentClassifier, canonical_queries, char_ngrams, extract_keywords_and_intent_batch,
+    get_intent_index, load_intent_model, normalize_message
+)
+from scraper import default_website_map
+
+NONE_LABEL = ((), '', '')
+OFF_TOPIC_MESSAGES = [
+    "help me", "hi", "hii", "hello", "hey", "yes", "no", "thanks", "thank you", "ok", "okay", "bye",
+    "how are you", "who are you", "what can you do", "tell me a joke", "what is the weather",
+    "what time is it", "good morning", "good night", "are you a robot", "what is your name",
+    "i like pizza", "recommend a movie", "how tall is the eiffel tower", "what day is today",
+    "translate this to spanish", "play some music", "never mind", "test", "asdf", "lol"
+]
+PREFIXES = [
+    "i need help with", "can you tell me about", "question about", "i want to ask about",
+    "please help, i have a question:", "quick question", "info on"
+]
+SUFFIXES = ["please", "thanks", "asap", "for my situation", "in san antonio"]
+LOGGED_QUERY = re.compile(r"Processing query: (.*), Intent: \w+, Keywords: ")
+
+
+def anchor_messages(website_map):
+    """Return the titles, synonyms, canonical questions and keywords the classifier learns to route."""
+    index = get_intent_index(website_map)
+    keywords = [normalize_message(keyword) for _, query_keywords in canonical_queries.values() for keyword in query_keywords]
+    return list(dict.fromkeys(
+        list(index.service_titles) + list(index.synonyms) + list(canonical_queries) + keywords + sorted(index.common_keywords)
+    ))
+
+
+def mixtures(messages, count, rng):
+    """Return count synthetic queries stitched from word runs of two random messages."""
+    queries = []
+    for _ in range(count):
+        parts = []
+        for message in rng.sample(messages, 2):
+            words = message.split()
+            start = rng.randrange(len(words))
+            parts.extend(words[start:start + rng.randint(1, 4)])
+        queries.append(' '.join(parts))
+    return queries
+
+
+def label_with_rules(messages, website_map):
+    """Label messages with the rule-based stages' (keywords, intent, corrected message)."""
+    results = extract_keywords_and_intent_batch(messages, 'training', website_map, {})
+    return [(tuple(keywords), intent, corrected_message) for keywords, intent, corrected_message, _ in results]
+
+
+def augment(message, rng):
+    """Return one noisy paraphrase of a message: typos, a dropped or swapped word, or extra words around it."""
+    words = message.split()
+    edit = rng.randrange(5)
+    if edit == 0 and len(words) > 2:
+        del words[rng.randrange(len(words))]
+    elif edit == 1 and len(words) > 1:
+        position = rng.randrange(len(words) - 1)
+        words[position], words[position + 1] = words[position + 1], words[position]
+    elif edit == 2:
+        words = rng.choice(PREFIXES).split() + words
+    elif edit == 3:
+        words = words + rng.choice(SUFFIXES).split()
+    return normalize_message(add_typos(' '.join(words), rng, rate=0.3))
+
+
+def read_logged_queries(log_paths, query_paths):
+    """Return the user messages from app.py's 'Processing query' log lines and from one-per-line query files."""
+    queries = []
+    for path in log_paths:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            queries.extend(match.group(1) for match in map(LOGGED_QUERY.search, f) if match)
+    for path in query_paths:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            queries.extend(line.strip() for line in f if line.strip())
+    return queries
+
+
+def label_logged_queries(queries, website_map, labels):
+    """Keep logged queries the rules route to a known label, and those they leave unrouted as negatives."""
+    messages = sorted({normalize_message(query) for query in queries} - {''})
+    examples = []
+    for message, label in zip(messages, label_with_rules(messages, website_map)):
+        if label in labels:
+            examples.append((message, label))
+        elif label[1] in ('general', 'feedback'):
+            examples.append((message, NONE_LABEL))
+    return examples
+
+
+def split_by_message(examples, fraction, rng):
+    """Split examples by base message into training and validation groups, holding out about fraction of each label's messages.
+
+    Every label keeps at least one training message, and a message appearing twice stays in one group.
+    """
+    by_label = {}
+    for message, label in dict(examples).items():
+        by_label.setdefault(label, []).append((message, label))
+    training = []
+    validation = []
+    for label in sorted(by_label, key=str):
+        messages = by_label[label]
+        rng.shuffle(messages)
+        held_out = min(round(len(messages) * fraction), len(messages) - 1)
+        validation.extend(messages[:held_out])
+        training.extend(messages[held_out:])
+    return training, validation
+
+
+def expand(examples, variants, rng):
+    """Return the examples together with variants noisy paraphrases of each."""
+    expanded = list(examples)
+    for message, label in examples:
+        expanded.extend((augment(message, rng), label) for _ in range(variants))
+    return expanded
+
+
+def fit_vocabulary(messages, ngram_range, min_df, max_features):
+    """Pick the most document-frequent n-grams and their smoothed inverse document frequencies."""
+    document_frequency = Counter(gram for message in messages for gram in set(char_ngrams(message, *ngram_range)))
+    kept = sorted((gram for gram, df in document_frequency.items() if df >= min_df), key=lambda gram: (-document_frequency[gram], gram))
+    vocabulary = kept[:max_features]
+    df = np.array([document_frequency[gram] for gram in vocabulary], dtype=np.float32)
+    idf = np.log((1 + len(messages)) / (1 + df)) + 1
+    return vocabulary, idf
+
+
+def feature_matrix(model, messages):
+    """Return the dense TF-IDF matrix of messages under the model's vocabulary."""
+    matrix = np.zeros((len(messages), len(model.vocabulary)), dtype=np.float32)
+    for row, message in enumerate(messages):
+        columns, values = model.features(message)
+        matrix[row, columns] = values
+    return matrix
+
+
+def softmax(logits):
+    """Row-wise softmax."""
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def train_weights(features, targets, classes, epochs, learning_rate, l2):
+    """Fit multinomial logistic regression by full-batch Adam."""
+    weights = np.zeros((features.shape[1], classes), dtype=np.float32)
+    bias = np.zeros(classes, dtype=np.float32)
+    onehot = np.eye(classes, dtype=np.float32)[targets]
+    moments = [np.zeros_like(weights), np.zeros_like(bias)]
+    velocities = [np.zeros_like(weights), np.zeros_like(bias)]
+    for step in range(1, epochs + 1):
+        error = (softmax(features @ weights + bias) - onehot) / len(targets)
+        gradients = [features.T @ error + l2 * weights, error.sum(axis=0)]
+        for parameter, gradient, moment, velocity in zip((weights, bias), gradients, moments, velocities):
+            moment *= 0.9
+            moment += 0.1 * gradient
+            velocity *= 0.999
+            velocity += 0.001 * gradient * gradient
+            parameter -= learning_rate * (moment / (1 - 0.9 ** step)) / (np.sqrt(velocity / (1 - 0.999 ** step)) + 1e-8)
+    return weights, bias
+
+
+def calibrate(logits, targets, none_class, precision):
+    """Fit a softmax temperature on held-out logits, then the lowest confidence cutoff meeting the precision target."""
+    temperatures = np.geomspace(0.25, 4.0, 25)
+    losses = [-np.log(softmax(logits / t)[np.arange(len(targets)), targets] + 1e-12).mean() for t in temperatures]
+    temperature = float(temperatures[int(np.argmin(losses))])
+    probabilities = softmax(logits / temperature)
+    predicted = probabilities.argmax(axis=1)
+    confidence = probabilities.max(axis=1)
+    routed = predicted != none_class
+    order = np.argsort(-confidence[routed], kind='stable')
+    correct = (predicted == targets)[routed][order]
+    accepted_precision = np.cumsum(correct) / np.arange(1, len(correct) + 1)
+    passing = np.nonzero(accepted_precision >= precision)[0]
+    cutoff = float(confidence[routed][order][passing[-1]]) if len(passing) else 1.0
+    accepted = routed & (confidence >= cutoff)
+    stats = {
+        'temperature': temperature,
+        'cutoff': cutoff,
+        'precision': float((predicted == targets)[accepted].mean()) if accepted.any() else 0.0,
+        'coverage': float(accepted[targets != none_class].mean()) if (targets != none_class).any() else 0.0,
+        'false_routes_on_negatives': int(accepted[targets == none_class].sum())
+    }
+    return temperature, cutoff, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the learned intent classifier from the routing tables and logged queries.")
+    parser.add_argument('--output', default='intent_model.npz', help="where to write the model arrays")
+    parser.add_argument('--log', action='append', default=[], help="chatbot.log to mine for user queries (repeatable)")
+    parser.add_argument('--queries', action='append', default=[], help="file with one user query per line (repeatable)")
+    parser.add_argument('--variants', type=int, default=10, help="noisy training paraphrases per example")
+    parser.add_argument('--mixtures', type=int, default=2000, help="synthetic queries stitched from anchor phrases and labelled by the rules")
+    parser.add_argument('--validation-fraction', type=float, default=0.2, help="share of each label's base messages held out, with their paraphrases, for calibration")
+    parser.add_argument('--validation-variants', type=int, default=10, help="held-out paraphrases per held-out example for calibration")
+    parser.add_argument('--max-features', type=int, default=4096, help="size of the n-gram vocabulary")
+    parser.add_argument('--min-df', type=int, default=2, help="minimum document frequency of a kept n-gram")
+    parser.add_argument('--epochs', type=int, default=150, help="full-batch optimization steps")
+    parser.add_argument('--learning-rate', type=float, default=0.05, help="Adam step size")
+    parser.add_argument('--l2', type=float, default=1e-4, help="weight decay")
+    parser.add_argument('--precision', type=float, default=0.98, help="held-out precision the confidence cutoff must reach")
+    parser.add_argument('--seed', type=int, default=13, help="random seed for paraphrase generation")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    load_intent_model(None)
+    website_map = default_website_map()
+    messages = anchor_messages(website_map)
+    anchors = [(message, label) for message, label in zip(messages, label_with_rules(messages, website_map)) if label[1] not in ('general', 'feedback')]
+    anchors.extend((normalize_message(message), NONE_LABEL) for message in OFF_TOPIC_MESSAGES)
+    labels = list(dict.fromkeys(label for _, label in anchors))
+    examples = anchors + label_logged_queries(read_logged_queries(args.log, args.queries), website_map, set(labels))
+    rng = random.Random(args.seed)
+    synthetic = label_logged_queries(mixtures(messages, args.mixtures, rng), website_map, set(labels))
+    examples.extend(synthetic[:len(synthetic) // 2])
+    class_of = {label: position for position, label in enumerate(labels)}
+
+    training_examples, validation_examples = split_by_message(examples, args.validation_fraction, rng)
+    training = expand(training_examples, args.variants, rng)
+    validation = validation_examples + [(augment(message, rng), label) for message, label in validation_examples for _ in range(args.validation_variants)]
+    validation.extend(synthetic[len(synthetic) // 2:])
+    training_messages = {message for message, _ in training}
+    validation = [(message, label) for message, label in validation if message not in training_messages]
+
+    ngram_range = (2, 4)
+    vocabulary, idf = fit_vocabulary([message for message, _ in training], ngram_range, args.min_df, args.max_features)
+    model = LearnedIntentClassifier(vocabulary, idf, np.zeros((len(vocabulary), len(labels))), np.zeros(len(labels)), labels, ngram_range=ngram_range)
+    weights, bias = train_weights(
+        feature_matrix(model, [message for message, _ in training]),
+        np.array([class_of[label] for _, label in training]), len(labels), args.epochs, args.learning_rate, args.l2
+    )
+    logits = feature_matrix(model, [message for message, _ in validation]) @ weights + bias
+    temperature, cutoff, stats = calibrate(logits, np.array([class_of[label] for _, label in validation]), class_of[NONE_LABEL], args.precision)
+
+    model.weights, model.bias, model.temperature, model.cutoff = weights, bias, temperature, cutoff
+    model.save(args.output)
+    print(f"{len(examples)} examples ({len(validation_examples)} held out), {len(training)} training and {len(validation)} held-out messages, "
+          f"{len(labels)} labels, {len(vocabulary)} n-grams")
+    print(f"temperature {stats['temperature']:.3f}, cutoff {stats['cutoff']:.3f}: held-out precision {stats['precision']:.3f}, "
+          f"coverage {stats['coverage']:.3f}, {stats['false_routes_on_negatives']} negatives routed")
+    print(f"Model written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,362 @@
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+import faiss
+import numpy as np
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS, Chroma
+
+MANIFEST_FILE = 'manifest.json'
+LOCK_FILE = '.lock'
+BUILDS_DIR = 'builds'
+MANIFEST_FORMAT = 2
+VECTOR_BACKENDS = ('chroma', 'faiss-flat', 'faiss-hnsw')
+FAISS_INDEX_FILE = 'index.faiss'
+FAISS_DOCSTORE_FILE = 'docstore.json'
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+# Map the saved vectors instead of reading them into private memory, so worker processes share the pages
+# (faiss only maps flat codes with IO_FLAG_MMAP_IFC, which releases before the one in requirements.txt lack)
+FAISS_READ_FLAGS = ('IO_FLAG_MMAP', 'IO_FLAG_READ_ONLY', 'IO_FLAG_MMAP_IFC')
+# Superseded builds stay on disk this long, so workers still reading one can finish and reopen the manifest's build
+BUILD_RETENTION_SECONDS = 600
+SPLITTER_CONFIG = {'splitter': 'RecursiveCharacterTextSplitter', 'chunk_size': 500, 'chunk_overlap': 50}
+_update_lock = threading.Lock()
+
+
+def section_key(doc):
+    """Return the 'page_title|content_type' key of the database row a document came from."""
+    return f"{doc.metadata.get('page_title', '')}|{doc.metadata.get('content_type', 'description')}"
+
+
+def document_hash(doc):
+    """Return a SHA-256 of a document's text and metadata."""
+    digest = hashlib.sha256(json.dumps(doc.metadata, sort_keys=True).encode('utf-8'))
+    digest.update(doc.page_content.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def read_manifest(persist_root):
+    """Return the manifest describing the active build, or None if there is none or it is unreadable."""
+    try:
+        with open(os.path.join(persist_root, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.error(f"Error reading vector store manifest: {str(e)}")
+        return None
+
+
+def write_manifest(persist_root, manifest):
+    """Write the manifest through a temporary file and os.replace, so readers see the old or the new one whole."""
+    path = os.path.join(persist_root, MANIFEST_FILE)
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+@contextlib.contextmanager
+def vector_store_lock(persist_root):
+    """Hold an exclusive lock on <persist_root>/.lock, serializing builds, manifest swaps and cleanup across threads and processes."""
+    with _update_lock:
+        with open(os.path.join(persist_root, LOCK_FILE), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def retire_build(persist_root, build):
+    """Mark a build superseded now, starting its BUILD_RETENTION_SECONDS on disk."""
+    try:
+        os.utime(os.path.join(persist_root, BUILDS_DIR, build))
+    except OSError as e:
+        logging.warning(f"Error marking vector store build {build} superseded: {str(e)}")
+
+
+def remove_stale_builds(persist_root, active_build):
+    """Delete superseded builds and legacy root-level files the manifest does not reference.
+
+    Anything newer than the manifest, or retired less than BUILD_RETENTION_SECONDS ago, is kept.
+    """
+    manifest_time = min(os.path.getmtime(os.path.join(persist_root, MANIFEST_FILE)), time.time() - BUILD_RETENTION_SECONDS)
+    paths = [os.path.join(persist_root, name) for name in os.listdir(persist_root) if name not in (MANIFEST_FILE, LOCK_FILE, BUILDS_DIR)]
+    builds_root = os.path.join(persist_root, BUILDS_DIR)
+    paths.extend(os.path.join(builds_root, build) for build in os.listdir(builds_root) if build != active_build)
+    for path in paths:
+        try:
+            if os.path.getmtime(path) > manifest_time:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.unlink(path)
+        except OSError as e:
+            logging.warning(f"Error removing stale vector store file {path}: {str(e)}")
+
+
+def split_documents(documents):
+    """Split documents into chunks with the configured splitter."""
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=SPLITTER_CONFIG['chunk_size'], chunk_overlap=SPLITTER_CONFIG['chunk_overlap'], length_function=len
+    )
+    return text_splitter.split_documents(documents)
+
+
+def chunk_ids(key, count):
+    """Return the stable ids 'page_title|content_type|i' of a section's chunks."""
+    return [f"{key}|{position}" for position in range(count)]
+
+
+def changed_documents(documents, indexed):
+    """Split documents into the manifest entries of sections whose hash matches indexed and a list of the other documents."""
+    unchanged = {}
+    changed = []
+    for doc in documents:
+        key = section_key(doc)
+        if indexed.get(key, {}).get('hash') == document_hash(doc):
+            unchanged[key] = indexed[key]
+        else:
+            changed.append(doc)
+    return unchanged, changed
+
+
+def index_documents(vector_store, documents, indexed, batch_size=64):
+    """Stream documents (one per section key) through the splitter, upserting chunks of sections whose hash differs from indexed.
+
+    Returns the manifest entry of every section seen and the keys that were re-embedded.
+    """
+    sections = {}
+    changed = []
+    chunks = []
+    ids = []
+    for doc in documents:
+        key = section_key(doc)
+        digest = document_hash(doc)
+        if indexed.get(key, {}).get('hash') == digest:
+            sections[key] = indexed[key]
+            continue
+        section_chunks = split_documents([doc])
+        sections[key] = {'hash': digest, 'chunks': len(section_chunks)}
+        changed.append(key)
+        chunks.extend(section_chunks)
+        ids.extend(chunk_ids(key, len(section_chunks)))
+        if len(chunks) >= batch_size:
+            vector_store.add_documents(chunks, ids=ids)
+            chunks, ids = [], []
+    if chunks:
+        vector_store.add_documents(chunks, ids=ids)
+    return sections, changed
+
+
+def collect_faiss_build(documents, embeddings, indexed, previous, batch_size=64):
+    """Gather the chunks and vectors of a FAISS build, reusing the previous build's vectors for unchanged sections.
+
+    Returns the manifest entry of every section seen, the re-embedded keys, and the (id, text, metadata) records with their vectors.
+    """
+    positions = {chunk_id: position for position, chunk_id in previous.index_to_docstore_id.items()} if previous else {}
+    sections = {}
+    changed = []
+    records = []
+    vectors = []
+    pending = []
+
+    def embed_pending():
+        texts = [records[position][1] for position in pending]
+        for position, vector in zip(pending, embeddings.embed_documents(texts)):
+            vectors[position] = np.asarray(vector, dtype=np.float32)
+        pending.clear()
+
+    for doc in documents:
+        key = section_key(doc)
+        digest = document_hash(doc)
+        previous_ids = chunk_ids(key, indexed.get(key, {}).get('chunks', 0))
+        if indexed.get(key, {}).get('hash') == digest and all(chunk_id in positions for chunk_id in previous_ids):
+            for chunk_id in previous_ids:
+                chunk = previous.docstore.search(chunk_id)
+                records.append((chunk_id, chunk.page_content, chunk.metadata))
+                vectors.append(previous.index.reconstruct(positions[chunk_id]))
+            sections[key] = indexed[key]
+            continue
+        section_chunks = split_documents([doc])
+        sections[key] = {'hash': digest, 'chunks': len(section_chunks)}
+        changed.append(key)
+        for chunk_id, chunk in zip(chunk_ids(key, len(section_chunks)), section_chunks):
+            pending.append(len(records))
+            records.append((chunk_id, chunk.page_content, chunk.metadata))
+            vectors.append(None)
+        if len(pending) >= batch_size:
+            embed_pending()
+    if pending:
+        embed_pending()
+    return sections, changed, records, vectors
+
+
+def save_faiss_build(build_directory, backend, records, vectors):
+    """Write a flat or HNSW FAISS index and its chunk records to a new build directory."""
+    matrix = np.vstack(vectors).astype(np.float32)
+    if backend == 'faiss-hnsw':
+        index = faiss.IndexHNSWFlat(matrix.shape[1], HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    else:
+        index = faiss.IndexFlatL2(matrix.shape[1])
+    index.add(matrix)
+    os.makedirs(build_directory)
+    faiss.write_index(index, os.path.join(build_directory, FAISS_INDEX_FILE))
+    with open(os.path.join(build_directory, FAISS_DOCSTORE_FILE), 'w', encoding='utf-8') as f:
+        json.dump(records, f)
+
+
+def faiss_read_flags():
+    """Return the faiss read flags that memory-map an index read-only, raising if this faiss cannot map flat codes."""
+    missing = [name for name in FAISS_READ_FLAGS if not hasattr(faiss, name)]
+    if missing:
+        raise RuntimeError(f"faiss {faiss.__version__} lacks {', '.join(missing)} and would read indexes into private memory; "
+                           f"install the faiss-cpu version pinned in requirements.txt")
+    flags = 0
+    for name in FAISS_READ_FLAGS:
+        flags |= getattr(faiss, name)
+    return flags
+
+
+def load_faiss_build(build_directory, embeddings):
+    """Open a saved FAISS build with its index memory-mapped read-only."""
+    index = faiss.read_index(os.path.join(build_directory, FAISS_INDEX_FILE), faiss_read_flags())
+    with open(os.path.join(build_directory, FAISS_DOCSTORE_FILE), encoding='utf-8') as f:
+        records = json.load(f)
+    docstore = InMemoryDocstore({chunk_id: Document(page_content=text, metadata=metadata) for chunk_id, text, metadata in records})
+    vector_store = FAISS(embeddings, index, docstore, {position: record[0] for position, record in enumerate(records)})
+    vector_store.build = os.path.basename(build_directory)
+    return vector_store
+
+
+def open_build(backend, build_directory, embeddings):
+    """Open a build of the given backend, remembering its id as vector_store.build."""
+    if backend != 'chroma':
+        return load_faiss_build(build_directory, embeddings)
+    vector_store = Chroma(persist_directory=build_directory, embedding_function=embeddings)
+    vector_store.build = os.path.basename(build_directory)
+    return vector_store
+
+
+def update_vector_store(vector_store, documents, persist_root):
+    """Re-embed only the sections whose hash changed since the manifest was written, and drop removed ones.
+
+    A published build is never modified, since other processes have it open: Chroma changes go into a copy of the build,
+    FAISS changes into a new index reusing the unchanged vectors, and the result is swapped in. If another process swapped in a build since vector_store was
+    opened, that build is opened first, so unchanged sections are taken from the build the manifest describes.
+    Returns the store to use from now on and the changed keys.
+    """
+    with vector_store_lock(persist_root):
+        return _update_build(vector_store, documents, persist_root)
+
+
+def _update_build(vector_store, documents, persist_root):
+    """Bring the manifest's build up to date with documents; the caller holds vector_store_lock."""
+    manifest = read_manifest(persist_root)
+    indexed = manifest['sections']
+    if getattr(vector_store, 'build', None) != manifest['build']:
+        logging.debug(f"Vector store build {manifest['build']} was swapped in by another process; opening it")
+        vector_store = open_build(manifest['backend'], os.path.join(persist_root, BUILDS_DIR, manifest['build']), vector_store.embeddings)
+    if manifest['backend'] == 'chroma':
+        sections, pending = changed_documents(documents, indexed)
+        changed = [section_key(doc) for doc in pending]
+    else:
+        sections, changed, records, vectors = collect_faiss_build(documents, vector_store.embeddings, indexed, vector_store)
+    if not sections and not changed:
+        logging.error("No documents to index; keeping the vector store as it is")
+        return vector_store, []
+    removed = [key for key in indexed if key not in sections and key not in changed]
+    if not changed and not removed:
+        return vector_store, []
+    previous_build = manifest['build']
+    manifest['build'] = uuid.uuid4().hex
+    build_directory = os.path.join(persist_root, BUILDS_DIR, manifest['build'])
+    stale_ids = []
+    try:
+        if manifest['backend'] == 'chroma':
+            shutil.copytree(os.path.join(persist_root, BUILDS_DIR, previous_build), build_directory)
+            copy = open_build('chroma', build_directory, vector_store.embeddings)
+            updated, _ = index_documents(copy, pending, indexed)
+            sections.update(updated)
+        for key in changed:
+            stale_ids.extend(chunk_ids(key, indexed.get(key, {}).get('chunks', 0))[sections[key]['chunks']:])
+        for key in removed:
+            stale_ids.extend(chunk_ids(key, indexed[key]['chunks']))
+        if manifest['backend'] == 'chroma':
+            if stale_ids:
+                copy.delete(ids=stale_ids)
+            vector_store = copy
+        else:
+            save_faiss_build(build_directory, manifest['backend'], records, vectors)
+            vector_store = load_faiss_build(build_directory, vector_store.embeddings)
+    except Exception:
+        shutil.rmtree(build_directory, ignore_errors=True)
+        raise
+    manifest['sections'] = sections
+    write_manifest(persist_root, manifest)
+    retire_build(persist_root, previous_build)
+    remove_stale_builds(persist_root, manifest['build'])
+    logging.debug(f"Vector store updated: {len(changed)} sections re-embedded, {len(removed)} removed, {len(stale_ids)} stale chunks deleted")
+    return vector_store, changed + removed
+
+
+def open_vector_store(documents, embeddings, model_id, persist_root, backend='chroma'):
+    """Open the persisted build, re-embedding only changed sections; a new backend, model or splitter gets a fresh build swapped in.
+
+    Runs under vector_store_lock, so workers starting together build once and the others open that build.
+    """
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"Unknown vector store backend {backend!r}; expected one of {', '.join(VECTOR_BACKENDS)}")
+    if backend != 'chroma':
+        faiss_read_flags()  # fail before embedding anything
+    os.makedirs(os.path.join(persist_root, BUILDS_DIR), exist_ok=True)
+    settings = {'format': MANIFEST_FORMAT, 'backend': backend, 'embedding_model': model_id, 'splitter': SPLITTER_CONFIG}
+    with vector_store_lock(persist_root):
+        current = read_manifest(persist_root)
+        if current and all(current.get(key) == value for key, value in settings.items()):
+            build_directory = os.path.join(persist_root, BUILDS_DIR, current.get('build', ''))
+            if current.get('build') and os.path.isdir(build_directory):
+                logging.debug(f"Vector store manifest matches; opening {backend} build {current['build']}")
+                vector_store = open_build(backend, build_directory, embeddings)
+                vector_store, _ = _update_build(vector_store, documents, persist_root)
+                return vector_store
+
+        manifest = dict(settings, build=uuid.uuid4().hex)
+        build_directory = os.path.join(persist_root, BUILDS_DIR, manifest['build'])
+        logging.debug(f"Vector store settings changed; embedding every section into {backend} build {manifest['build']}")
+        try:
+            if backend == 'chroma':
+                vector_store = open_build(backend, build_directory, embeddings)
+                manifest['sections'], _ = index_documents(vector_store, documents, {})
+            else:
+                manifest['sections'], _, records, vectors = collect_faiss_build(documents, embeddings, {}, None)
+            if not manifest['sections']:
+                raise ValueError("No documents to index")
+            if backend != 'chroma':
+                save_faiss_build(build_directory, backend, records, vectors)
+                vector_store = load_faiss_build(build_directory, embeddings)
+        except Exception:
+            shutil.rmtree(build_directory, ignore_errors=True)
+            raise
+        write_manifest(persist_root, manifest)
+        if current and current.get('build') and os.path.isdir(os.path.join(persist_root, BUILDS_DIR, current['build'])):
+            retire_build(persist_root, current['build'])
+        remove_stale_builds(persist_root, manifest['build'])
+    return vector_store